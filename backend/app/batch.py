@@ -0,0 +1,230 @@
+### OFFLINE BATCH EMBED / EXTRACT ###
+# Runs embed_message_file / extract_message over whole directories without the HTTP stack: no
+# multipart uploads, spooled temp files or buffered responses. Files are mapped straight from
+# disk and spread over a process pool. Every finished file is appended to a progress journal in
+# the output directory, so an interrupted run picks up where it stopped.
+# Run from backend/:
+#   python -m app.batch embed <covers...> --message secret.txt --output out/ [--key K --n-lsb 2 ...]
+#   python -m app.batch embed mix.mp3 --message big.bin --output out/ --processes 1 --shard-processes 8
+#   python -m app.batch extract <stegos...> --output out/ [--key K] [--manifest keys.jsonl]
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.pool import iter_bounded
+from app.new import embed_message_file, embed_message_parallel_file, extract_message
+from app.util import write_file
+
+PROGRESS_FILE = ".batch-progress.jsonl"
+BATCH_EXTENSIONS = (".mp3",)
+EMBED_OPTIONS = ("message", "key", "n_LSB", "is_encrypt", "is_random", "is_scatter", "compression")
+EXTRACT_OPTIONS = ("key",)
+
+def glob_root(pattern):
+    # Leading directories of a glob pattern that hold no wildcards
+    root = pattern
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+def iter_batch_inputs(patterns):
+    # (name, path) for every *.mp3 below a directory and every match of a glob pattern (name
+    # relative to the directory or to the pattern's leading directories) and every plain file
+    # (name = file name), in a stable order
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(BATCH_EXTENSIONS):
+                        path = os.path.join(root, file_name)
+                        yield os.path.relpath(path, pattern), path
+        elif glob.has_magic(pattern):
+            root = glob_root(pattern)
+            for path in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(path):
+                    yield os.path.relpath(path, root), path
+        else:
+            yield os.path.basename(pattern), pattern
+
+def load_manifest(path):
+    # Per-file options from a JSON lines file: {"name": "song.mp3", "key": "...", "n_LSB": 2, ...}.
+    # An entry matches an input by its name (relative to its directory) or by its file name.
+    manifest = {}
+    if path is None:
+        return manifest
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{line_number}: {e}")
+            if "name" not in entry:
+                raise ValueError(f"{path}:{line_number}: manifest entry without a name")
+            manifest[entry.pop("name")] = entry
+    return manifest
+
+def load_progress(output_dir):
+    # Names already done in an earlier run, whose outputs are still there
+    done = {}
+    try:
+        with open(os.path.join(output_dir, PROGRESS_FILE)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # Line cut short by an interrupted run
+                if record["status"] == "success" and os.path.exists(os.path.join(output_dir, record["output"])):
+                    done[record["name"]] = record
+                else:
+                    done.pop(record["name"], None)
+    except FileNotFoundError:
+        pass
+    return done
+
+def run_embed_job(job):
+    # Embeds into a temporary file that is renamed when complete, so a killed run never leaves
+    # an output that looks finished
+    start = time.perf_counter()
+    output_path = os.path.join(job["output_dir"], job["output"])
+    record = {"name": job["name"], "input": job["path"], "output": job["output"], "bytes_in": 0}
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        record["bytes_in"] = os.path.getsize(job["path"])
+        options = (job.get("is_encrypt", False), job.get("key", ""), job.get("is_random", False),
+                   job.get("n_LSB", 1), job.get("is_scatter", False), job.get("compression", "none"))
+        if job.get("shard_processes", 1) > 1:
+            embed_message_parallel_file(job["path"], job["message"], output_path + ".part", *options, processes=job["shard_processes"])
+        else:
+            embed_message_file(job["path"], job["message"], output_path + ".part", *options)
+        os.replace(output_path + ".part", output_path)
+        record.update(status="success", bytes_out=os.path.getsize(output_path))
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+def run_extract_job(job):
+    start = time.perf_counter()
+    record = {"name": job["name"], "input": job["path"], "bytes_in": 0}
+    try:
+        record["bytes_in"] = os.path.getsize(job["path"])
+        result = extract_message(job["path"], job.get("key", ""))
+        record["output"] = os.path.splitext(job["name"])[0] + result["extension"]
+        output_path = os.path.join(job["output_dir"], record["output"])
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        write_file(output_path + ".part", result["data"])
+        os.replace(output_path + ".part", output_path)
+        record.update(status="success", bytes_out=len(result["data"]), mime_type=result["mime_type"])
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+def find_duplicate(names):
+    seen = set()
+    for name in names:
+        if name in seen:
+            return name
+        seen.add(name)
+    return None
+
+def iter_jobs(inputs, defaults, manifest, allowed, output_dir, done):
+    # One job per input not finished yet; manifest entries override the command line options.
+    # The same manifest serves both commands, so options of the other one are ignored.
+    for name, path in inputs:
+        if name in done:
+            continue
+        options = manifest.get(name, manifest.get(os.path.basename(name), {}))
+        unknown = set(options) - set(EMBED_OPTIONS)
+        if unknown:
+            raise ValueError(f"{name}: unknown manifest options {sorted(unknown)}")
+        options = {option: value for option, value in options.items() if option in allowed}
+        yield dict(defaults, **options, name=name, path=path, output_dir=output_dir, output=name)
+
+def run_batch(run_job, jobs, output_dir, processes=None, restart=False):
+    # Runs the jobs over a process pool, appending each record to the progress journal as it
+    # completes. At most two jobs per process are in flight. Returns the list of records.
+    processes = processes or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    records = []
+    with open(os.path.join(output_dir, PROGRESS_FILE), "w" if restart else "a") as journal, \
+            ProcessPoolExecutor(max_workers=processes) as executor:
+        submit = lambda job: executor.submit(run_job, job)
+        for _, future in iter_bounded(submit, jobs, 2 * processes):
+            record = future.result()
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+            records.append(record)
+            status = "ok" if record["status"] == "success" else "FAILED: " + record["error"]
+            print(f"{record['name']}: {status}", file=sys.stderr)
+    return records
+
+def report_throughput(records, skipped, elapsed):
+    done = [record for record in records if record["status"] == "success"]
+    failed = len(records) - len(done)
+    megabytes = sum(record["bytes_in"] for record in done) / (1 << 20)
+    print(f"{len(done)} done, {failed} failed, {skipped} skipped (already done) in {elapsed:.2f} s: "
+          f"{len(done) / elapsed if elapsed else 0:.2f} files/s, {megabytes / elapsed if elapsed else 0:.2f} MB/s",
+          file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed or extract hidden messages for whole directories")
+    commands = parser.add_subparsers(dest="command", required=True)
+    embed = commands.add_parser("embed", help="hide messages in cover MP3s")
+    extract = commands.add_parser("extract", help="recover messages from stego MP3s")
+    for command in (embed, extract):
+        command.add_argument("inputs", nargs="+", help="directories (*.mp3, recursively), glob patterns or files")
+        command.add_argument("--output", required=True, help="output directory (also holds the progress journal)")
+        command.add_argument("--manifest", help="JSON lines file of per-file options, matched by name")
+        command.add_argument("--key", default="", help="key for encryption and random start")
+        command.add_argument("--processes", type=int, help="worker processes (default: all cores)")
+        command.add_argument("--restart", action="store_true", help="ignore the progress of earlier runs")
+    embed.add_argument("--message", help="message file for every cover without one in the manifest")
+    embed.add_argument("--n-lsb", type=int, default=1, choices=range(1, 5), help="LSBs used per byte")
+    embed.add_argument("--encrypt", action="store_true", help="encrypt with the key")
+    embed.add_argument("--random", action="store_true", help="random start frame from the key")
+    embed.add_argument("--scatter", action="store_true", help="frame order permuted from the key")
+    embed.add_argument("--compression", default="none", choices=("none", "zlib", "lzma"))
+    embed.add_argument("--shard-processes", type=int, default=1,
+                       help="processes sharing each large message (e.g. hour-long mixes; use with --processes 1)")
+    args = parser.parse_args(argv)
+
+    if args.command == "embed":
+        run_job, allowed = run_embed_job, EMBED_OPTIONS
+        defaults = {"message": args.message, "key": args.key, "n_LSB": args.n_lsb, "is_encrypt": args.encrypt,
+                    "is_random": args.random, "is_scatter": args.scatter, "compression": args.compression,
+                    "shard_processes": args.shard_processes}
+    else:
+        run_job, allowed = run_extract_job, EXTRACT_OPTIONS
+        defaults = {"key": args.key}
+
+    inputs = list(iter_batch_inputs(args.inputs))
+    # Names key the outputs and the progress journal; extracted files keep only the stem
+    output_names = (name if args.command == "embed" else os.path.splitext(name)[0] for name, _ in inputs)
+    duplicate = find_duplicate(output_names)
+    if duplicate is not None:
+        parser.error(f"several inputs map to the output {duplicate}; pass their common parent directory instead")
+    try:
+        manifest = load_manifest(args.manifest)
+        done = {} if args.restart else load_progress(args.output)
+        jobs = list(iter_jobs(inputs, defaults, manifest, allowed, args.output, done))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.command == "embed":
+        missing = [job["name"] for job in jobs if not job.get("message")]
+        if missing:
+            parser.error(f"no message for {len(missing)} covers (first: {missing[0]}); use --message or the manifest")
+
+    start = time.perf_counter()
+    records = run_batch(run_job, jobs, args.output, args.processes, args.restart)
+    report_throughput(records, len(inputs) - len(jobs), time.perf_counter() - start)
+    return 1 if any(record["status"] != "success" for record in records) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+### CACHE UTILITIES ###
+import hashlib
+import threading
+from collections import OrderedDict
+
+def content_hash(data):
+    # SHA-256 is hardware accelerated on current CPUs and collision-safe as a cache key
+    return hashlib.sha256(data).digest()
+
+named_caches = {} # name -> LRUCache of this process, for the metrics
+
+class LRUCache:
+    # Least-recently-used cache bounded by entry count and by the total size reported on put()
+    def __init__(self, max_entries, max_bytes, name=None):
+        if name is not None:
+            named_caches[name] = self
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (value, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self.lock:
+            if size > self.max_bytes or self.max_entries <= 0:
+                return # Would evict everything else and still not fit
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+def cache_counters():
+    # {name: (hits, misses)} of the named caches of this process
+    counters = {}
+    for name, cache in named_caches.items():
+        stats = cache.stats()
+        counters[name] = (stats["hits"], stats["misses"])
+    return counters
@@ -0,0 +1,37 @@
+### AUTOKEY VIGENERE CIPHER ###
+# Byte-oriented version of util.encrypt_vigenere / util.decrypt_vigenere with the same
+# ciphertext: c[i] = p[i] + k[i] (mod 256) where the key stream k is the key followed by the plaintext.
+import numpy as np
+
+def key_to_bytes(key):
+    # Key characters count mod 256, exactly like ord(key[i]) in the string version
+    return np.array([ord(c) % 256 for c in key], dtype=np.uint8)
+
+def encrypt_vigenere_bytes(plaintext, key):
+    if (key == ""):
+        return bytes(plaintext)
+    plain = np.frombuffer(plaintext, dtype=np.uint8)
+    key_bytes = key_to_bytes(key)[:len(plain)]
+
+    # One add over the whole key stream
+    key_stream = np.concatenate([key_bytes, plain[:len(plain) - len(key_bytes)]])
+    return (plain + key_stream).tobytes()
+
+def decrypt_vigenere_bytes(ciphertext, key):
+    if (key == ""):
+        return bytes(ciphertext)
+    cipher = np.frombuffer(ciphertext, dtype=np.uint8)
+    key_bytes = key_to_bytes(key)
+    block = len(key_bytes)
+    rows = -(-len(cipher) // block)
+
+    # Row r of the key-length blocks satisfies p[r] = c[r] - p[r-1] with p[-1] = key, which unrolls to
+    # p[r] = (-1)^r * (sum_{t<=r} (-1)^t c[t] - key): an alternating cumulative sum down each column
+    blocks = np.zeros(rows * block, dtype=np.uint8)
+    blocks[:len(cipher)] = cipher
+    blocks = blocks.reshape(rows, block)
+    blocks[1::2] = -blocks[1::2]
+    plain = np.cumsum(blocks, axis=0, dtype=np.uint8)
+    plain -= key_bytes
+    plain[1::2] = -plain[1::2]
+    return plain.ravel()[:len(cipher)].tobytes()
@@ -0,0 +1,81 @@
+### PAYLOAD COMPRESSION ###
+# Optional stage before encryption: a compressed payload touches fewer audio bytes and fits in
+# smaller covers. The codec index is stored in the stego header (new.HEADER_FLAG_CODEC).
+# Both directions work on chunks, so decompression output is produced (and bounded) piece by piece.
+import lzma
+import os
+import zlib
+
+COMPRESSION_CODECS = ("none", "zlib", "lzma") # Position is the value stored in the header
+COMPRESS_CHUNK_SIZE = 1 << 20 # Bytes fed to or taken from the codec per call
+DECOMPRESS_LIMIT = int(os.environ.get("DECOMPRESS_LIMIT", 1 << 30)) # Largest payload accepted when extracting
+
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}] # Raw stream: no container header or checksum to embed
+
+def codec_index(codec):
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression codec: {codec}")
+    return COMPRESSION_CODECS.index(codec)
+
+def codec_name(index):
+    if index >= len(COMPRESSION_CODECS):
+        raise ValueError("Unknown compression codec in stego header")
+    return COMPRESSION_CODECS[index]
+
+def iter_chunks(data, chunk_size=COMPRESS_CHUNK_SIZE):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start+chunk_size]
+
+def iter_compressed(chunks, codec):
+    if codec == "zlib":
+        compressor = zlib.compressobj(9)
+    else:
+        compressor = lzma.LZMACompressor(format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def compress_bytes(data, codec):
+    if codec_index(codec) == 0:
+        return bytes(data)
+    return b"".join(iter_compressed(iter_chunks(data), codec))
+
+def iter_decompressed(chunks, codec, limit=DECOMPRESS_LIMIT):
+    # Output pieces of at most COMPRESS_CHUNK_SIZE bytes. Corrupt or truncated input (e.g. a wrong
+    # key) and output beyond limit bytes raise ValueError.
+    produced = 0
+    try:
+        if codec == "zlib":
+            decompressor = zlib.decompressobj()
+            for chunk in chunks:
+                while chunk and not decompressor.eof:
+                    data = decompressor.decompress(chunk, COMPRESS_CHUNK_SIZE)
+                    chunk = decompressor.unconsumed_tail
+                    produced += len(data)
+                    if produced > limit:
+                        raise ValueError("Decompressed payload is too large")
+                    yield data
+        else:
+            decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+            for chunk in chunks:
+                while not decompressor.eof:
+                    data = decompressor.decompress(chunk, COMPRESS_CHUNK_SIZE)
+                    chunk = b""
+                    produced += len(data)
+                    if produced > limit:
+                        raise ValueError("Decompressed payload is too large")
+                    yield data
+                    if decompressor.needs_input:
+                        break
+    except (zlib.error, lzma.LZMAError) as e:
+        raise ValueError("Compressed payload is corrupt") from e
+    if not decompressor.eof:
+        raise ValueError("Compressed payload is truncated")
+
+def decompress_bytes(data, codec, limit=DECOMPRESS_LIMIT):
+    if codec_index(codec) == 0:
+        return bytes(data)
+    return b"".join(iter_decompressed(iter_chunks(data), codec, limit))
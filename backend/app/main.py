@@ -1,14 +1,37 @@
-from fastapi import FastAPI, UploadFile, Form, Response
+from fastapi import FastAPI, UploadFile, Form, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+from time import perf_counter
 import uvicorn
 from io import BytesIO
 import os
-from app.tugas2 import calculatePSNR
-from app.new import embed_message, extract_message
+import shutil
+import tempfile
+from app.tugas2 import calculatePSNR_bytes, calculatePSNR_batch
+from app.new import embed_message_bytes, embed_message_stream, extract_message_bytes, get_capacity, inspect_message
+from app.new import get_frame_table_stream, table_payload_bytes, plan_message_batch, stream_stego_zip
+from app.new import iter_stego_archive, extract_message_entry, ExtractResultArchive, extract_message_range_bytes
+from app.pool import worker_pool, PoolBusy, iter_bounded
+from app.metrics import RequestTimings, registry, run_timed
 
-app = FastAPI()
+# LOG_LEVEL=DEBUG also logs embed/extract details; below the configured level a log call costs one check
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    worker_pool.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+BUSY_DETAIL = "Server sedang sibuk, silakan coba lagi nanti"
+TIMEOUT_DETAIL = "Waktu pemrosesan habis"
 
 # Configure CORS
 app.add_middleware(
@@ -24,6 +47,48 @@ app.add_middleware(
 def home():
     return {"message": "Hello Steganografi!"}
 
+async def run_worker(timings, fn, *args, **kwargs):
+    # worker_pool.run that also brings back the stage timings and cache lookups of the job
+    start = perf_counter()
+    result, worker_stages, cache_lookups = await worker_pool.run(run_timed, fn, *args, **kwargs)
+    timings.add_worker(perf_counter() - start, worker_stages)
+    registry.add_cache_lookups(cache_lookups)
+    return result
+
+async def spool_upload(upload):
+    # Copy of an upload in a temporary file for a response body to read while it streams: FastAPI
+    # closes form uploads when the handler returns, before the body is sent
+    spooled = tempfile.TemporaryFile()
+    try:
+        upload.file.seek(0)
+        await run_in_threadpool(shutil.copyfileobj, upload.file, spooled)
+        spooled.seek(0)
+    except BaseException:
+        spooled.close()
+        raise
+    return spooled
+
+def close_after(chunks, spooled):
+    # The body chunks, then closes (and so deletes) the spooled copy, also when the client leaves
+    try:
+        yield from chunks
+    finally:
+        spooled.close()
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text format: stage histograms and byte counters of this server process
+    pool = worker_pool.stats()
+    lines = [
+        "# HELP stego_pool_pending Jobs running or queued in the worker pool",
+        "# TYPE stego_pool_pending gauge",
+        f"stego_pool_pending {pool['pending']}",
+        "# HELP stego_pool_processes Worker processes",
+        "# TYPE stego_pool_processes gauge",
+        f"stego_pool_processes {pool['processes']}",
+    ]
+    return PlainTextResponse(registry.render() + "\n".join(lines) + "\n")
+
 # ============== INSERT (embed) ==============
 @app.post("/embed")
 async def embed(
@@ -31,147 +96,453 @@ async def embed(
     message: UploadFile,                     # file txt/file lain
     useEncryption: str = Form(...),          # "true" / "false"
     useRandomStart: str = Form(...),         # "true" / "false"
-    nLSB: int = Form(...),                   # jumlah bit LSB yang digunakan (1-8)
-    seed: str = Form(""),                     # kunci/seed untuk enkripsi dan random start
-    outputName: str = Form(...)
+    nLSB: int = Form(...),                   # jumlah bit LSB yang digunakan (1-4)
+    seed: str = Form(""),                    # kunci/seed untuk enkripsi dan random start
+    outputName: str = Form(...),
+    useScatter: str = Form("false"),         # "true" / "false", urutan frame diacak dari seed
+    compression: str = Form("none")          # "none" / "zlib" / "lzma", kompresi pesan sebelum disisipkan
 ):
+    timings = RequestTimings("embed")
     try:
-        # Save temporary files
-        temp_audio = "temp_audio.mp3"
-        temp_message = "temp_message.bin"
-        
-        # Save uploaded files temporarily
-        with open(temp_audio, "wb") as audio_file:
-            audio_file.write(await cover.read())
-        with open(temp_message, "wb") as message_file:
-            message_file.write(await message.read())
-        
-        try:
-            # Process embedding
-            is_encrypt = useEncryption.lower() == "true"
-            is_random = useRandomStart.lower() == "true"
-            output_bytes = embed_message(
-                audio_path=temp_audio,
-                message_path=temp_message,
-                is_encrypt=is_encrypt,
+        with timings.stage("upload"):
+            audio_data = await cover.read()
+            message_data = await message.read()
+
+        # Process embedding in memory
+        is_encrypt = useEncryption.lower() == "true"
+        is_random = useRandomStart.lower() == "true"
+        is_scatter = useScatter.lower() == "true"
+        output_bytes = await run_worker(
+            timings,
+            embed_message_bytes,
+            audio_data=audio_data,
+            message=message_data,
+            is_encrypt=is_encrypt,
+            key=seed,
+            is_random=is_random,
+            n_LSB=nLSB,
+            is_scatter=is_scatter,
+            compression=compression
+        )
+
+        return Response(
+            content=output_bytes,
+            media_type="audio/mpeg",
+            headers={
+                "Content-Disposition": f"attachment; filename={outputName}.mp3",
+                "Server-Timing": timings.finish(len(audio_data) + len(message_data), len(output_bytes))
+            }
+        )
+
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
+    except Exception as e:
+        error_msg = str(e)
+        if "exceeds maximum capacity" in error_msg:
+            raise HTTPException(status_code=400, detail="Ukuran file pesan terlalu besar untuk disisipkan ke audio ini")
+        return {"status": "error", "message": error_msg}
+
+# ============== INSERT (streaming) ==========
+@app.post("/embed/stream")
+async def embed_stream(
+    cover: UploadFile,                       # file mp3 asli
+    message: UploadFile,                     # file txt/file lain
+    useEncryption: str = Form(...),          # "true" / "false"
+    useRandomStart: str = Form(...),         # "true" / "false"
+    nLSB: int = Form(...),                   # jumlah bit LSB yang digunakan (1-4)
+    seed: str = Form(""),                    # kunci/seed untuk enkripsi dan random start
+    outputName: str = Form(...),
+    useScatter: str = Form("false"),         # "true" / "false", urutan frame diacak dari seed
+    compression: str = Form("none")          # "none" / "zlib" / "lzma", kompresi pesan sebelum disisipkan
+):
+    timings = RequestTimings("embed_stream")
+    audio_file = None
+    try:
+        with timings.stage("upload"):
+            message_data = await message.read()
+            audio_file = await spool_upload(cover)
+
+        # The cover is read from the spooled copy in chunks and never held in memory whole.
+        # The file object cannot be handed to a worker process, so the scan runs in a thread instead.
+        with timings.stage("scan_plan"):
+            chunks = await run_in_threadpool(
+                embed_message_stream,
+                audio_file=audio_file,
+                message=message_data,
+                is_encrypt=useEncryption.lower() == "true",
                 key=seed,
-                is_random=is_random,
-                n_LSB=nLSB
+                is_random=useRandomStart.lower() == "true",
+                n_LSB=nLSB,
+                is_scatter=useScatter.lower() == "true",
+                compression=compression
             )
-            
-            # Save temporary stego file to calculate PSNR
-            temp_stego = "temp_stego.mp3"
-            with open(temp_stego, "wb") as stego_file:
-                stego_file.write(output_bytes)
 
-            try:
-                # Return MP3 file and PSNR value
-                return Response(
-                    content=output_bytes,
-                    media_type="audio/mpeg",
-                    headers={
-                        "Content-Disposition": f"attachment; filename={outputName}.mp3"
-                    }
-                )
-            finally:
-                # Clean up temporary stego file
-                if os.path.exists(temp_stego):
-                    os.remove(temp_stego)
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_audio):
-                os.remove(temp_audio)
-            if os.path.exists(temp_message):
-                os.remove(temp_message)
+        # Streaming the body happens after the headers, so it is not part of Server-Timing
+        return StreamingResponse(
+            close_after(chunks, audio_file),
+            media_type="audio/mpeg",
+            headers={
+                "Content-Disposition": f"attachment; filename={outputName}.mp3",
+                "Server-Timing": timings.finish(len(message_data))
+            }
+        )
+
+    except Exception as e:
+        if audio_file is not None:
+            audio_file.close()
+        error_msg = str(e)
+        if "exceeds maximum capacity" in error_msg:
+            raise HTTPException(status_code=400, detail="Ukuran file pesan terlalu besar untuk disisipkan ke audio ini")
+        return {"status": "error", "message": error_msg}
+
+# ============== INSERT (batch) ==============
+def per_payload(values, count):
+    # A form field sent once applies to every payload
+    return values * count if len(values) == 1 else values
+
+@app.post("/embed/batch")
+async def embed_batch(
+    cover: UploadFile,                       # file mp3 asli
+    messages: list[UploadFile],              # beberapa file pesan
+    useEncryption: list[str] = Form(...),    # "true" / "false", satu per pesan (atau satu untuk semua)
+    useRandomStart: list[str] = Form(...),   # "true" / "false", satu per pesan (atau satu untuk semua)
+    nLSB: list[int] = Form(...),             # jumlah bit LSB (1-4), satu per pesan (atau satu untuk semua)
+    seed: list[str] = Form([""]),            # kunci/seed, satu per pesan (atau satu untuk semua)
+    outputName: str = Form(...),
+    useScatter: list[str] = Form(["false"]), # "true" / "false", satu per pesan (atau satu untuk semua)
+    compression: list[str] = Form(["none"])  # "none" / "zlib" / "lzma", satu per pesan (atau satu untuk semua)
+):
+    options = [per_payload(values, len(messages)) for values in (useEncryption, useRandomStart, nLSB, seed, useScatter, compression)]
+    if any(len(values) != len(messages) for values in options):
+        raise HTTPException(status_code=400, detail="Jumlah opsi harus satu atau sama dengan jumlah pesan")
 
+    timings = RequestTimings("embed_batch")
+    audio_file = None
+    try:
+        with timings.stage("upload"):
+            message_datas = [await message.read() for message in messages]
+            audio_file = await spool_upload(cover)
+        jobs = [
+            {
+                "name": f"{outputName}_{i+1}.mp3",
+                "message": message_data,
+                "is_encrypt": encrypt.lower() == "true",
+                "is_random": random_start.lower() == "true",
+                "n_LSB": n_LSB,
+                "key": key,
+                "is_scatter": scatter.lower() == "true",
+                "compression": codec
+            }
+            for i, (message_data, encrypt, random_start, n_LSB, key, scatter, codec) in enumerate(zip(message_datas, *options))
+        ]
+
+        # The cover is parsed once; planning is split over the worker processes, which only
+        # need the (compact) frame table. The zip is then streamed from the spooled copy.
+        with timings.stage("scan"):
+            table = await run_in_threadpool(get_frame_table_stream, audio_file)
+        if len(table) == 0:
+            raise ValueError("No valid MP3 frames found")
+        payload_bytes = table_payload_bytes(table)
+        audio_size = audio_file.seek(0, os.SEEK_END)
+        groups = [jobs[i::worker_pool.processes] for i in range(min(worker_pool.processes, len(jobs)))]
+        # Every group is awaited before an error (e.g. PoolBusy) is raised, so none is left running unattended
+        group_plans = await asyncio.gather(*(
+            run_worker(timings, plan_message_batch, table, payload_bytes, audio_size, group)
+            for group in groups
+        ), return_exceptions=True)
+        for group_plan in group_plans:
+            if isinstance(group_plan, BaseException):
+                raise group_plan
+        plans = [None] * len(jobs)
+        for i, group_plan in enumerate(group_plans):
+            plans[i::worker_pool.processes] = group_plan
+
+        return StreamingResponse(
+            close_after(stream_stego_zip(audio_file, [(job["name"], runs) for job, runs in zip(jobs, plans)]), audio_file),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename={outputName}.zip",
+                "Server-Timing": timings.finish(sum(map(len, message_datas)))
+            }
+        )
+
+    except PoolBusy:
+        audio_file.close()
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        audio_file.close()
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
     except Exception as e:
+        if audio_file is not None:
+            audio_file.close()
         error_msg = str(e)
         if "exceeds maximum capacity" in error_msg:
             raise HTTPException(status_code=400, detail="Ukuran file pesan terlalu besar untuk disisipkan ke audio ini")
         return {"status": "error", "message": error_msg}
 
+# ============== CAPACITY ====================
+@app.post("/capacity")
+async def capacity(
+    response: Response,
+    cover: UploadFile,                       # file mp3 asli
+    messageSize: int = Form(None)            # ukuran pesan (byte) untuk rekomendasi nLSB
+):
+    timings = RequestTimings("capacity")
+    try:
+        with timings.stage("upload"):
+            audio_data = await cover.read()
+        capacity_bytes, recommended = await run_worker(timings, get_capacity, audio_data, messageSize)
+        response.headers["Server-Timing"] = timings.finish(len(audio_data))
+
+        return {
+            "status": "success",
+            "capacity": [{"nLSB": n_LSB, "maxBytes": max_bytes} for n_LSB, max_bytes in capacity_bytes.items()],
+            "recommendedNLSB": recommended,
+            "message": "Capacity calculation successful"
+        }
+
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
 # ============== EXTRACT =====================
+def parse_byte_range(range_header):
+    # Single "bytes=a-b", "bytes=a-" or "bytes=-n" range as slice bounds (start, end);
+    # None for anything else, which is answered with the whole payload
+    unit, _, spec = range_header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in spec:
+        return None
+    try:
+        if first == "":
+            return (-int(last), None) if int(last) > 0 else (0, 0) # Suffix range
+        start = int(first)
+        end = int(last) + 1 if last != "" else None
+    except ValueError:
+        return None
+    if start < 0 or (end is not None and end <= start):
+        return None
+    return start, end
+
 @app.post("/extract")
 async def extract(
     stego: UploadFile,                      # file stego mp3
     seed: str = Form(""),                    # kunci untuk dekripsi dan random start
-    extractName: str = Form(...)
+    extractName: str = Form(...),
+    range_header: str = Header(None, alias="Range") # "bytes=a-b" untuk mengambil sebagian pesan saja
 
 ):
+    timings = RequestTimings("extract")
     try:
-        # Save temporary file
-        temp_stego = "temp_stego.mp3"
-        
-        # Save uploaded file temporarily
-        with open(temp_stego, "wb") as stego_file:
-            stego_file.write(await stego.read())
-        
-        try:
-            result = extract_message(stego_path=temp_stego, key=seed)
+        with timings.stage("upload"):
+            stego_data = await stego.read()
 
+        byte_range = parse_byte_range(range_header) if range_header else None
+        if byte_range is not None:
+            # Only the frames holding the requested bytes (and the head, for the MIME type) are read
+            start, end = byte_range
+            result = await run_worker(timings, extract_message_range_bytes, stego_data, start, end, key=seed)
+            total_size = result["total_size"]
+            if not result["data"]:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{total_size}"})
             return Response(
                 content=result["data"],
+                status_code=206,
                 media_type=result["mime_type"],
                 headers={
-                    "Content-Disposition": f"attachment; filename={extractName}{result['extension']}"
+                    "Content-Disposition": f"attachment; filename={extractName}{result['extension']}",
+                    "Content-Range": f"bytes {result['start']}-{result['end'] - 1}/{total_size}",
+                    "Accept-Ranges": "bytes",
+                    "Server-Timing": timings.finish(len(stego_data), len(result["data"]))
                 }
             )
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_stego):
-                os.remove(temp_stego)
+
+        result = await run_worker(timings, extract_message_bytes, stego_data=stego_data, key=seed)
+
+        return Response(
+            content=result["data"],
+            media_type=result["mime_type"],
+            headers={
+                "Content-Disposition": f"attachment; filename={extractName}{result['extension']}",
+                "Accept-Ranges": "bytes",
+                "Server-Timing": timings.finish(len(stego_data), len(result["data"]))
+            }
+        )
+
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# ============== EXTRACT (batch) =============
+async def run_when_free(fn, *args):
+    # Batch jobs wait for a free slot instead of failing with 503 half way through the response
+    while True:
+        try:
+            result, _, cache_lookups = await worker_pool.run(run_timed, fn, *args)
+            registry.add_cache_lookups(cache_lookups)
+            return result
+        except PoolBusy:
+            await asyncio.sleep(0.05)
+
+async def extract_batch_archive(archive_file, stego_files, key):
+    # Keep two files per worker process in flight and write results in input order
+    # The archive is read in a thread, which hands each job to the event loop
+    try:
+        results = ExtractResultArchive()
+        loop = asyncio.get_running_loop()
+        submit = lambda item: asyncio.run_coroutine_threadsafe(run_when_free(extract_message_entry, item[1], key), loop)
+        entries = iter_bounded(submit, stego_files, 2 * worker_pool.processes)
+        while True:
+            entry = await run_in_threadpool(next, entries, None)
+            if entry is None:
+                break
+            (name, _), future = entry
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.TimeoutError:
+                result = {"error": TIMEOUT_DETAIL}
+            results.add(name, result)
+            yield results.take()
+        results.close()
+        yield results.take()
+    finally:
+        archive_file.close() # The spooled copy, also when the client leaves
+
+@app.post("/extract/batch")
+async def extract_batch(
+    archive: UploadFile,                     # file zip/tar berisi file stego mp3
+    seed: str = Form(""),                    # kunci untuk dekripsi dan random start (sama untuk semua file)
+    extractName: str = Form(...)
+):
+    timings = RequestTimings("extract_batch")
+    archive_file = None
+    try:
+        with timings.stage("open"):
+            archive_file = await spool_upload(archive)
+            stego_files = await run_in_threadpool(iter_stego_archive, archive_file)
+
+        return StreamingResponse(
+            extract_batch_archive(archive_file, stego_files, seed),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": f"attachment; filename={extractName}.zip",
+                "Server-Timing": timings.finish()
+            }
+        )
+
+    except Exception as e:
+        if archive_file is not None:
+            archive_file.close()
+        return {"status": "error", "message": str(e)}
+
+# ============== INSPECT =====================
+@app.post("/inspect")
+async def inspect(
+    response: Response,
+    stego: UploadFile                       # file stego mp3
+):
+    timings = RequestTimings("inspect")
+    try:
+        # Only the first frames (and the tail) are read from the spooled upload
+        with timings.stage("inspect"):
+            info = await run_in_threadpool(inspect_message, stego.file)
+        response.headers["Server-Timing"] = timings.finish(info["bytes_read"])
+
+        return {
+            "status": "success",
+            "nLSB": info["n_LSB"],
+            "useEncryption": info["is_encrypt"],
+            "useRandomStart": info["is_random"],
+            "useScatter": info["is_scatter"],
+            "compression": info["compression"],
+            "headerVersion": info["version"],
+            "messageSize": info["message_length"] // 8,
+            "message": "Inspection successful"
+        }
 
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    
+
 # ============== CALCULATE PSNR =====================
 @app.post("/calculate")
 async def calculate(
+    response: Response,
     cover: UploadFile = Form(...),    # file mp3 asli
     stego: UploadFile = Form(...)     # file mp3 stego
 ):
+    timings = RequestTimings("calculate")
     try:
-        # Save temporary files
-        temp_cover = "temp_cover.mp3"
-        temp_stego = "temp_stego.mp3"
-
-        try:
-            # Save uploaded files
+        with timings.stage("upload"):
             cover_content = await cover.read()
             stego_content = await stego.read()
-            
-            with open(temp_cover, "wb") as f:
-                f.write(cover_content)
-            with open(temp_stego, "wb") as f:
-                f.write(stego_content)
-
-            print(f"[INFO] Files saved: {temp_cover}, {temp_stego}")
-
-            # Calculate PSNR
-            psnr_value = calculatePSNR(temp_cover, temp_stego)
-            print(f"[INFO] PSNR calculated: {psnr_value}")
-            
-            return {
-                "status": "success",
-                "psnr": float(psnr_value),
-                "message": "PSNR calculation successful"
-            }
-            
-        finally:
-            # Clean up temporary files
-            if os.path.exists(temp_cover):
-                os.remove(temp_cover)
-            if os.path.exists(temp_stego):
-                os.remove(temp_stego)
 
+        # Calculate PSNR, decoding both files from memory
+        psnr_value = await run_worker(timings, calculatePSNR_bytes, cover_content, stego_content)
+        logger.info("PSNR calculated: %s", psnr_value)
+        response.headers["Server-Timing"] = timings.finish(len(cover_content) + len(stego_content))
+
+        return {
+            "status": "success",
+            "psnr": float(psnr_value),
+            "message": "PSNR calculation successful"
+        }
+
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
     except Exception as e:
-        print(f"[ERROR] Calculate PSNR failed: {str(e)}")
+        logger.error("Calculate PSNR failed: %s", e)
         return {
             "status": "error",
             "message": str(e),
             "psnr": None
         }
 
+@app.post("/calculate/batch")
+async def calculate_batch(
+    response: Response,
+    cover: UploadFile = Form(...),          # file mp3 asli
+    stegos: list[UploadFile] = Form(...)    # beberapa file mp3 stego
+):
+    timings = RequestTimings("calculate_batch")
+    try:
+        with timings.stage("upload"):
+            cover_content = await cover.read()
+            stego_contents = [await stego.read() for stego in stegos]
+
+        # The cover is decoded once and compared against every stego
+        results = await run_worker(timings, calculatePSNR_batch, cover_content, stego_contents)
+        logger.info("PSNR calculated for %d stego files", len(results))
+        response.headers["Server-Timing"] = timings.finish(len(cover_content) + sum(map(len, stego_contents)))
+
+        return {
+            "status": "success",
+            "results": [
+                {"filename": stego.filename, "psnr": None, "message": str(result)}
+                if isinstance(result, Exception) else
+                {"filename": stego.filename, "psnr": float(result), "message": "PSNR calculation successful"}
+                for stego, result in zip(stegos, results)
+            ],
+            "message": "Batch PSNR calculation finished"
+        }
+
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=TIMEOUT_DETAIL)
+    except Exception as e:
+        logger.error("Batch PSNR failed: %s", e)
+        return {"status": "error", "message": str(e)}
+
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
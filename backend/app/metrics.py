@@ -0,0 +1,151 @@
+### METRICS ###
+# Per-stage timings for the hot paths. The engine marks its stages with stage(); they are only
+# timed while a collector is active (run_timed or RequestTimings), so library use pays nothing.
+# Requests report their stages as a Server-Timing header and into the registry behind /metrics.
+# Worker processes have caches of their own, so each job also brings back its cache hits and misses.
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from app.cache import cache_counters
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60) # Seconds
+
+current_timings = ContextVar("current_timings", default=None) # List of (stage, seconds) or None
+
+@contextmanager
+def stage(name):
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, perf_counter() - start))
+
+def run_timed(fn, *args, **kwargs):
+    # Returns (fn(*args, **kwargs), stage timings, {cache: (hits, misses)} during the call); used to
+    # bring timings and cache counters back from worker processes
+    timings = []
+    before = cache_counters()
+    token = current_timings.set(timings)
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        current_timings.reset(token)
+    lookups = {}
+    for name, (hits, misses) in cache_counters().items():
+        old_hits, old_misses = before.get(name, (0, 0))
+        lookups[name] = (hits - old_hits, misses - old_misses)
+    return result, timings, lookups
+
+class Histogram:
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    # Stage histograms and byte counters per endpoint, rendered in the Prometheus text format
+    def __init__(self):
+        self.stages = {} # (endpoint, stage) -> Histogram
+        self.bytes = {} # (endpoint, direction) -> total bytes
+        self.cache_lookups = {} # (cache, "hit" / "miss") -> lookups in worker processes
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint, stage_name, seconds):
+        with self.lock:
+            histogram = self.stages.get((endpoint, stage_name))
+            if histogram is None:
+                histogram = self.stages[(endpoint, stage_name)] = Histogram()
+            histogram.observe(seconds)
+
+    def add_bytes(self, endpoint, direction, n_bytes):
+        with self.lock:
+            self.bytes[(endpoint, direction)] = self.bytes.get((endpoint, direction), 0) + n_bytes
+
+    def add_cache_lookups(self, lookups):
+        with self.lock:
+            for name, (hits, misses) in lookups.items():
+                for result, count in (("hit", hits), ("miss", misses)):
+                    self.cache_lookups[(name, result)] = self.cache_lookups.get((name, result), 0) + count
+
+    def render(self):
+        lines = [
+            "# HELP stego_stage_seconds Time spent per request stage",
+            "# TYPE stego_stage_seconds histogram",
+        ]
+        with self.lock:
+            for (endpoint, stage_name), histogram in sorted(self.stages.items()):
+                labels = f'endpoint="{endpoint}",stage="{stage_name}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'stego_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'stego_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"stego_stage_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"stego_stage_seconds_count{{{labels}}} {histogram.count}")
+
+            lines.append("# HELP stego_bytes_total Bytes processed per endpoint")
+            lines.append("# TYPE stego_bytes_total counter")
+            for (endpoint, direction), total in sorted(self.bytes.items()):
+                lines.append(f'stego_bytes_total{{endpoint="{endpoint}",direction="{direction}"}} {total}')
+
+            # Worker processes plus the lookups made in this process (e.g. from threads)
+            lookups = dict(self.cache_lookups)
+        for name, (hits, misses) in cache_counters().items():
+            for result, count in (("hit", hits), ("miss", misses)):
+                lookups[(name, result)] = lookups.get((name, result), 0) + count
+        lines.append("# HELP stego_cache_lookups_total Frame and PCM cache lookups of the server and its workers")
+        lines.append("# TYPE stego_cache_lookups_total counter")
+        for (name, result), count in sorted(lookups.items()):
+            lines.append(f'stego_cache_lookups_total{{cache="{name}",result="{result}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+class RequestTimings:
+    # Stages of one request, in order. finish() records them (plus the total) in the registry.
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.start = perf_counter()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, perf_counter() - start))
+
+    def add_worker(self, elapsed, worker_stages):
+        # Stages timed inside a worker; the rest of the round trip (queueing, pickling) is "pool"
+        self.stages.extend(worker_stages)
+        self.stages.append(("pool", max(elapsed - sum(seconds for _, seconds in worker_stages), 0)))
+
+    def header(self):
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        entries.append(f"total;dur={(perf_counter() - self.start) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def finish(self, bytes_in=0, bytes_out=0):
+        for name, seconds in self.stages:
+            registry.observe(self.endpoint, name, seconds)
+        registry.observe(self.endpoint, "total", perf_counter() - self.start)
+        if bytes_in:
+            registry.add_bytes(self.endpoint, "in", bytes_in)
+        if bytes_out:
+            registry.add_bytes(self.endpoint, "out", bytes_out)
+        return self.header()
@@ -1,250 +1,804 @@
-from calendar import c
-import re
-from app.util import extract_frame_info, calc_bitrate, calc_sample_rate, calculate_frame_size
+import logging
+import os
+import shutil
+import struct
+import tarfile
+import zipfile
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from multiprocessing import shared_memory
+from contextlib import contextmanager
+import numpy as np
+from app.cache import LRUCache, content_hash
+from app.metrics import stage
+from app.pool import iter_bounded
+from app.util import find_sync_candidates, read_frame_headers, decode_frame_headers, follow_frame_chain
+from app.util import decode_frame_header
 from app.util import get_mime_type, get_extension_from_mime
-from app.util import read_file, write_file, get_file_size
-from app.util import encrypt_vigenere, decrypt_vigenere
-from app.util import generate_rand_index
+from app.util import read_file, write_file, get_file_size, map_file, close_quietly
+from app.cipher import encrypt_vigenere_bytes, decrypt_vigenere_bytes
+from app.compress import compress_bytes, iter_decompressed, iter_chunks, codec_index, codec_name
+from app.util import generate_rand_index, generate_frame_permutation, bits_to_lsb_groups, lsb_groups_to_bits
+
+logger = logging.getLogger(__name__)
+
+def scan_frame_candidates(data, end, offset=0):
+    # Locate and decode every sync candidate below end at once (positions shifted by offset)
+    candidates = find_sync_candidates(data, end)
+    frame_sizes, has_crcs = decode_frame_headers(read_frame_headers(data, candidates))
+    return candidates + offset, frame_sizes, has_crcs
+
+def link_frame_arrays(candidates, frame_sizes, has_crcs, end):
+    # Returns the (offsets, sizes, has_crcs) arrays of the frame chain
+    valid = frame_sizes > 0
+    positions = candidates[valid]
+    frame_sizes = frame_sizes[valid]
+    has_crcs = has_crcs[valid]
+
+    # Link every valid header to the first valid header at or after its frame end
+    frame_ends = positions + frame_sizes
+    succ = np.searchsorted(positions, frame_ends)
+    succ_pos = np.append(positions, end)[succ]
+    # A lone frame is dropped when a non-sync byte sits between it and the next header
+    sync_count = np.searchsorted(candidates, succ_pos) - np.searchsorted(candidates, frame_ends)
+    drops_lone = sync_count < (succ_pos - frame_ends)
+
+    chain = follow_frame_chain(succ)
+
+    # Skip leading frames that would have been reset while they were alone
+    keep = np.flatnonzero(~drops_lone[chain])
+    chain = chain[keep[0]:] if len(keep) else chain[:0]
+    return positions[chain], frame_sizes[chain], has_crcs[chain]
+
+def frame_arrays_to_list(offsets, frame_sizes, has_crcs):
+    return list(zip(offsets.tolist(), frame_sizes.tolist(), has_crcs.tolist()))
+
+EMPTY_FRAME_ARRAYS = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool))
+
+def scan_audio_frames(audio_data):
+    # Frame chain of audio_data as (offsets, sizes, has_crcs) arrays
+    data = np.frombuffer(audio_data, dtype=np.uint8)
+    end = len(data) - 4 # Same bound as the byte loop: every header read has 4 bytes
+    if end <= 0:
+        return EMPTY_FRAME_ARRAYS
+    return link_frame_arrays(*scan_frame_candidates(data, end), end)
 
 def get_audio_frames(audio_data):
-    frames = []
+    # List of (offset, size, has_crc) tuples; the engine uses the compact get_frame_table instead
+    return frame_arrays_to_list(*scan_audio_frames(audio_data))
+
+STREAM_CHUNK_SIZE = 1 << 20 # Bytes held in memory per read when streaming a cover
+
+def scan_audio_frames_stream(audio_file, chunk_size=STREAM_CHUNK_SIZE):
+    # Same frame arrays as scan_audio_frames, reading audio_file one chunk at a time.
+    # The last 4 bytes of each chunk are carried over so no header straddles a boundary.
+    parts = []
+    carry = b''
+    offset = 0
+    while True:
+        chunk = audio_file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = carry + chunk
+        end = len(buffer) - 4
+        if end > 0:
+            parts.append(scan_frame_candidates(np.frombuffer(buffer, dtype=np.uint8), end, offset))
+            carry = buffer[end:]
+            offset += end
+        else:
+            carry = buffer
+    if not parts:
+        return EMPTY_FRAME_ARRAYS
+    candidates, frame_sizes, has_crcs = (np.concatenate(part) for part in zip(*parts))
+    return link_frame_arrays(candidates, frame_sizes, has_crcs, offset)
+
+def get_audio_frames_stream(audio_file, chunk_size=STREAM_CHUNK_SIZE):
+    return frame_arrays_to_list(*scan_audio_frames_stream(audio_file, chunk_size))
+
+SCAN_WINDOW = 1 << 16 # Bytes searched per step when the lazy iterator hunts for the next header
+
+def find_next_frame(data, i, end, window=SCAN_WINDOW):
+    # First valid header at or after i (below end) as (position, frame size, has_crc), or None,
+    # plus whether a non-sync byte was skipped on the way
+    frame_size, has_crc = decode_frame_header(bytes(data[i:i+4]))
+    if frame_size:
+        return (i, frame_size, has_crc), False
+
+    skipped_non_sync = False
+    start = i
+    while start < end:
+        stop = min(start + window, end)
+        candidates, frame_sizes, has_crcs = scan_frame_candidates(data[start:stop+4], stop - start, start)
+        valid = np.flatnonzero(frame_sizes > 0)
+        if len(valid):
+            j = int(candidates[valid[0]])
+            skipped_non_sync = skipped_non_sync or valid[0] < j - start # Fewer sync candidates than bytes skipped
+            return (j, int(frame_sizes[valid[0]]), bool(has_crcs[valid[0]])), skipped_non_sync
+        skipped_non_sync = skipped_non_sync or len(candidates) < stop - start
+        start = stop
+    return None, skipped_non_sync
+
+def iter_audio_frames(audio_data, window=SCAN_WINDOW):
+    # Lazy get_audio_frames: yields the same frames in order and only reads as far as the consumer
+    # goes. A chain's first frame is held back until the frame after it confirms it is not a lone one.
+    data = np.frombuffer(audio_data, dtype=np.uint8)
+    end = len(data) - 4
+    pending = None
+    chained = False
     i = 0
-    while i < len(audio_data) - 4:
-        if audio_data[i] == 0xFF and (audio_data[i+1] & 0xE0) == 0xE0:  # Sync bits
-            try:
-                frame_info = extract_frame_info(audio_data[i:i+4])
-                bitrate = calc_bitrate(frame_info['version_id'], frame_info['layer_desc'], frame_info['bitrate_index'])
-                sample_rate = calc_sample_rate(frame_info['version_id'], frame_info['sampling_rate_index'])
-                if bitrate == 0 or sample_rate == 0:
-                    i += 1
-                    continue
-                frame_size = calculate_frame_size(bitrate * 1000, sample_rate, frame_info['padding_bit'])
-                frames.append((i, frame_size, frame_info['protection_bit'] == 0))
-                i += frame_size
-            except Exception as e:
-                i += 1
+    while i < end:
+        frame, skipped_non_sync = find_next_frame(data, i, end, window)
+        if skipped_non_sync and not chained:
+            pending = None # Reset if only one frame found and next is invalid
+        if frame is None:
+            break
+        if chained:
+            yield frame
+        elif pending is None:
+            pending = frame
         else:
-            if len(frames) == 1:
-                frames = []  # Reset if only one frame found and next is invalid
-            i += 1
-    return frames
+            yield pending
+            yield frame
+            pending = None
+            chained = True
+        i = frame[0] + frame[1]
+    if pending is not None:
+        yield pending
+
+### FRAME TABLE ###
+# One 24-byte record per frame: where its payload starts and ends in the file, and how many
+# payload bytes the frames before it hold. The prefix sum maps a payload offset to its frame
+# in O(log n); a list of (offset, size, has_crc) tuples took over 120 bytes per frame.
+FRAME_TABLE_DTYPE = np.dtype([
+    ("payload_start", np.int64), # After the 4-byte header and the optional 2-byte CRC
+    ("payload_end", np.int64), # Frame end
+    ("capacity_before", np.int64), # Payload bytes in all earlier frames
+])
+
+def fill_capacity_before(table):
+    capacity = table["payload_end"] - table["payload_start"]
+    table["capacity_before"][:1] = 0
+    np.cumsum(capacity[:-1], out=table["capacity_before"][1:])
+    return table
+
+def make_frame_table(offsets, frame_sizes, has_crcs):
+    table = np.empty(len(offsets), dtype=FRAME_TABLE_DTYPE)
+    table["payload_start"] = offsets + 4 + 2 * has_crcs.astype(np.int64)
+    table["payload_end"] = offsets + frame_sizes
+    return fill_capacity_before(table)
+
+def frame_table_from_list(frames):
+    if not frames:
+        return make_frame_table(*EMPTY_FRAME_ARRAYS)
+    offsets, frame_sizes, has_crcs = (np.array(column) for column in zip(*frames))
+    return make_frame_table(offsets, frame_sizes, has_crcs)
+
+def get_frame_table(audio_data):
+    return make_frame_table(*scan_audio_frames(audio_data))
+
+def get_frame_table_stream(audio_file, chunk_size=STREAM_CHUNK_SIZE):
+    return make_frame_table(*scan_audio_frames_stream(audio_file, chunk_size))
+
+def table_payload_bytes(table):
+    # Total payload bytes of all frames (calc_max_message with n_LSB=1)
+    if len(table) == 0:
+        return 0
+    last = table[-1]
+    return int(last["capacity_before"] + last["payload_end"] - last["payload_start"])
+
+def locate_payload_byte(table, byte_offset):
+    # (frame index, file position) of the byte_offset-th payload byte, counting frames in order
+    if byte_offset < 0 or byte_offset >= table_payload_bytes(table):
+        raise IndexError("Payload offset outside the frames")
+    frame_index = int(np.searchsorted(table["capacity_before"], byte_offset, side="right")) - 1
+    return frame_index, int(table["payload_start"][frame_index] + byte_offset - table["capacity_before"][frame_index])
+
+def locate_payload_bit(table, bit_offset, n_LSB=1):
+    # (frame index, file position, bit index inside the n_LSB group) of a payload bit offset;
+    # bit index 0 is the highest of the n_LSB bits, the first one written
+    frame_index, position = locate_payload_byte(table, bit_offset // n_LSB)
+    return frame_index, position, bit_offset % n_LSB
+
+### FRAME INDEX CACHE ###
+# Parsed frame tables keyed by content hash, shared by embed, extract and capacity queries.
+# Each worker process of the server has its own cache, so a repeat request only hits it when it
+# lands on the same worker; /metrics reports the hits and misses of all of them.
+FRAME_CACHE_ENTRIES = int(os.environ.get("FRAME_CACHE_ENTRIES", 64))
+FRAME_CACHE_BYTES = int(os.environ.get("FRAME_CACHE_BYTES", 256 << 20))
+frame_cache = LRUCache(FRAME_CACHE_ENTRIES, FRAME_CACHE_BYTES, "frame")
+
+def get_frame_index(audio_data):
+    # Returns (frame table, total payload bytes), parsing audio_data only on a cache miss
+    with stage("hash"):
+        key = content_hash(audio_data)
+    entry = frame_cache.get(key)
+    if entry is None:
+        with stage("parse"):
+            table = get_frame_table(audio_data)
+            entry = (table, table_payload_bytes(table))
+        frame_cache.put(key, entry, table.nbytes)
+    return entry
 
 ### MESSAGE PROCESSING ###
-def preprocess_message_metadata(filepath, max_message, is_encrypt=False, key="", is_random=False, n_LSB=1):
+# Metadata: the flag nibble (n_LSB, is_encrypt, is_random) in the low bits of the first payload
+# byte, then a fixed 14-byte header written n_LSB bits per payload byte:
+#   magic "STEG" | version | header flags | message length (bytes) | CRC32 of the message
+# The magic rejects clean files after at most 112 payload bytes, and the CRC catches a corrupted
+# payload or a wrong key. Version 1 files have no header: a length field in bits, as wide as
+# the capacity needs, whose low 3 bits are always 0 (whole bytes); a field with any of them set
+# or a zero length is read as a clean file.
+STEGO_MAGIC = b"STEG"
+STEGO_VERSION = 2
+STEGO_HEADER = struct.Struct(">4sBBII")
+STEGO_HEADER_BITS = STEGO_HEADER.size * 8
+# Version 1 files carry no magic or CRC, so about one clean file in 16 reads as one; reading them
+# is opt-in (STEGO_LEGACY_HEADERS=1) to keep that noise out of extract and scan results
+LEGACY_HEADERS = os.environ.get("STEGO_LEGACY_HEADERS", "0") == "1" # Read version 1 files when the magic is missing
+LENGTH_FLAG_BITS = 3
+HEADER_FLAG_SCATTER = 1 # Content frames in a key-derived permutation instead of a rotation
+HEADER_FLAG_CODEC = 6 # Index of the compression codec (app.compress.COMPRESSION_CODECS), 0 = none
+HEADER_FLAG_CODEC_SHIFT = 1
+
+def preprocess_message_metadata(filepath, max_message, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    # max_message only sized the version 1 length field; kept so existing callers still work
     with open(filepath, "rb") as f:
         content = f.read()
-    
+    return preprocess_message_bytes(content, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+
+def preprocess_message_bytes(content, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    # Returns (flag nibble and header bits, bytes to embed). Compression runs before encryption:
+    # ciphertext does not compress. The CRC covers the message as given.
+    checksum = zlib.crc32(content)
+    codec = codec_index(compression)
+    if codec:
+        content = compress_bytes(content, compression)
     if ( is_encrypt and key ):
-        content = encrypt_vigenere(content.decode('latin1'), key).encode('latin1')
-    bits = ''.join(format(byte, '08b') for byte in content)
+        content = encrypt_vigenere_bytes(content, key)
+    if len(content) >= 1 << 32:
+        raise ValueError("Message size exceeds maximum capacity of the audio")
 
-    # Bits for file size info
-    message_len = format(len(bits), '08b')
-    len_bits = message_len.rjust(max_message.bit_length(), '0')
-    print("Message Length (bits):", len_bits)
+    header_flags = (HEADER_FLAG_SCATTER if is_scatter else 0) | codec << HEADER_FLAG_CODEC_SHIFT
+    header = STEGO_HEADER.pack(STEGO_MAGIC, STEGO_VERSION, header_flags, len(content), checksum)
+    logger.debug("Stego header: %s", header.hex())
 
-    return format(n_LSB-1, '02b')+str(is_encrypt&1)+str(is_random&1)+len_bits, bits
+    flags = np.array([(n_LSB-1) >> 1, (n_LSB-1) & 1, is_encrypt&1, is_random&1], dtype=np.uint8)
+    metadata_bits = np.concatenate([flags, np.unpackbits(np.frombuffer(header, dtype=np.uint8))])
+    return metadata_bits, content
 
 def get_message_bytes(bits, is_encrypt=False, key=""):
-    message_bytes = bytearray()
-    for i in range(0, len(bits), 8):
-        byte = bits[i:i+8]
-        if len(byte) < 8:
-            break
-        message_bytes.append(int(byte, 2))
+    # Pack a 0/1 bit array into bytes, dropping an incomplete last byte
+    message_bytes = np.packbits(bits[:len(bits) - len(bits) % 8]).tobytes()
 
     if (is_encrypt and key):
-        message_bytes = decrypt_vigenere(message_bytes.decode('latin1'), key).encode('latin1')
+        message_bytes = decrypt_vigenere_bytes(message_bytes, key)
 
     return message_bytes
 
-### MAIN FUNCTIONS ###
-def embed_message(audio_path, message_path, is_encrypt=False, key="", is_random=False, n_LSB=1):
-    with open(audio_path, 'rb') as f:
-        audio_data = f.read()
+### PAYLOAD RANGES ###
+MAX_METADATA_BYTES = STEGO_HEADER_BITS # Header bits (or at most 64 length field bits) at one per payload byte
 
-    frames = get_audio_frames(audio_data)
-    if not frames:
-        raise ValueError("No valid MP3 frames found")
+def content_start(table, last_metadata_frame, last_metadata_bytes):
+    # Where the content begins after metadata that ended at last_metadata_bytes:
+    # (frame index, first byte or -1 for the whole frame)
+    if last_metadata_bytes >= table["payload_end"][last_metadata_frame]:
+        return last_metadata_frame + 1, -1 # Start from next frame
+    return last_metadata_frame, last_metadata_bytes
+
+def metadata_ranges(table):
+    # Header starts right after the flag byte and runs through the frames in order;
+    # only the frames that can hold it are listed
+    count = int(np.searchsorted(table["capacity_before"], 1 + MAX_METADATA_BYTES, side="right"))
+    starts = table["payload_start"][:count].copy()
+    starts[:1] += 1
+    return zip(starts.tolist(), table["payload_end"][:count].tolist())
+
+def content_order(key, last_metadata_frame, frame_count, is_random=False, is_scatter=False):
+    # Indices of the frames after the metadata, in the order the content is written
+    if is_scatter:
+        return generate_frame_permutation(key, last_metadata_frame, frame_count)
+    order = np.arange(last_metadata_frame, frame_count)
+    if is_random:
+        order = np.roll(order, -generate_rand_index(key, last_metadata_frame, frame_count)) # Random start frame index [0, len_avail_frames]
+    return order
+
+def content_table(table, order, last_metadata_frame, last_metadata_bytes):
+    # Frame table of the content stream: the frames listed in order, with capacity_before
+    # counting content bytes only
+    content = table[order]
+    if last_metadata_bytes != -1:
+        content["payload_start"][order == last_metadata_frame] = last_metadata_bytes
+    return fill_capacity_before(content)
+
+def message_ranges(table, order, last_metadata_frame, last_metadata_bytes):
+    content = content_table(table, order, last_metadata_frame, last_metadata_bytes)
+    return zip(content["payload_start"].tolist(), content["payload_end"].tolist())
+
+def content_group_ranges(content, group_start, group_end):
+    # (starts, ends) of the byte ranges holding n_LSB groups [group_start, group_end) of the
+    # content stream, found by binary search on capacity_before
+    first = int(np.searchsorted(content["capacity_before"], group_start, side="right")) - 1
+    last = int(np.searchsorted(content["capacity_before"], group_end, side="left"))
+    if group_end <= group_start or first < 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = content["payload_start"][first:last].copy()
+    starts[0] += group_start - content["capacity_before"][first]
+    return starts, content["payload_end"][first:last].copy()
 
-    stego_data = bytearray(audio_data)
+### EMBEDDING ENGINE ###
+def plan_lsb_groups(ranges, bits, n_LSB):
+    # Lay a 0/1 bit array over the n_LSB low bits of the bytes covered by ranges as write runs
+    # (start, values, clear_mask), one per contiguous range. A short last group only clears the
+    # top bits it carries, like the bit loop did.
+    # Returns (runs, bits placed, index of the last range used, byte index after the last placed byte)
+    values = bits_to_lsb_groups(bits, n_LSB)
+    runs, placed, range_index, next_bytes = place_lsb_values(ranges, values, n_LSB, len(values)*n_LSB - len(bits))
+    return runs, min(placed*n_LSB, len(bits)), range_index, next_bytes
 
-    max_message = calc_max_message(frames, n_LSB)
-    metadata_bits, message_bits = preprocess_message_metadata(message_path, max_message, is_encrypt, key, is_random, n_LSB)
+def place_lsb_values(ranges, values, n_LSB, tail_bits=0):
+    # plan_lsb_groups for values already grouped; the last value carries only n_LSB - tail_bits bits.
+    # Returns (runs, values placed, index of the last range used, byte index after the last placed byte)
+    runs = []
+    if len(values) == 0:
+        return runs, 0, -1, -1
+    mask = (1 << n_LSB) - 1
 
-    if ( 1 + (len(metadata_bits)-4 + (n_LSB-1))//n_LSB + (len(message_bits) + (n_LSB-1))//n_LSB > (max_message + (n_LSB-1))//n_LSB ):
+    placed = 0
+    range_index = -1
+    next_bytes = -1
+    for range_index, (start, end) in enumerate(ranges):
+        count = min(end - start, len(values) - placed)
+        if count <= 0:
+            continue
+        runs.append((start, values[placed:placed+count], mask))
+        placed += count
+        next_bytes = start + count
+        if placed == len(values):
+            break
+
+    if placed == len(values) and tail_bits:
+        start, run_values, _ = runs.pop()
+        if len(run_values) > 1:
+            runs.append((start, run_values[:-1], mask))
+        runs.append((start + len(run_values) - 1, run_values[-1:], mask & ~((1 << tail_bits) - 1)))
+    return runs, placed, range_index, next_bytes
+
+def runs_end(runs):
+    # Byte index after the last byte any run writes
+    return max((start + len(values) for start, values, _ in runs), default=0)
+
+def plan_metadata(table, payload_bytes, metadata_bits, message_bit_count, n_LSB=1):
+    # Capacity check, then the writes for the flag byte and the length field.
+    # Returns (runs, frame where the content starts, byte where it starts or -1)
+    max_message = payload_bytes * n_LSB
+    if ( 1 + (len(metadata_bits)-4 + (n_LSB-1))//n_LSB + (message_bit_count + (n_LSB-1))//n_LSB > (max_message + (n_LSB-1))//n_LSB ):
         raise ValueError("Message size exceeds maximum capacity of the audio")
 
     padding_bit = 4 # 2 bits for n_LSB, 1 bit for is_encrypt, 1 bit for is_random
 
-    bit_index = 0 # Index for message access
+    # Flag bits go in the first payload byte, then the length field in the following bytes
+    flags = np.array([metadata_bits[:padding_bit] @ [8, 4, 2, 1]], dtype=np.uint8)
+    runs = [(int(table["payload_start"][0]), flags, (1 << padding_bit) - 1)]
+    metadata_runs, placed, last_metadata_frame, last_metadata_bytes = plan_lsb_groups(metadata_ranges(table), metadata_bits[padding_bit:], n_LSB)
+    if placed < len(metadata_bits) - padding_bit:
+        raise ValueError("Not enough space to embed metadata")
+    runs += metadata_runs
+    return (runs, *content_start(table, last_metadata_frame, last_metadata_bytes))
 
-    frame_index = 0 # Current frame index
-    n = padding_bit-1 # insert first byte using padding-bit's length LSB
+def plan_embedding(table, payload_bytes, metadata_bits, message_bits, audio_size, key="", is_random=False, n_LSB=1, is_scatter=False):
+    # All byte writes for one embedding, as runs for apply_runs / stream_patched
+    runs, last_metadata_frame, last_metadata_bytes = plan_metadata(table, payload_bytes, metadata_bits, len(message_bits), n_LSB)
 
-    # Embed metadata bits in first bytes
-    while frame_index < len(frames):
-        frame_start, frame_size, has_crc = frames[frame_index]
-        data_end = frame_start + frame_size
-        current_bytes = frame_start + 4 + (2 if has_crc else 0)  # Current byte index in audio data
-
-        while current_bytes < data_end:
-            if metadata_bits[bit_index] == '0':
-                stego_data[current_bytes] &= ~(1 << n)
-            else:
-                stego_data[current_bytes] |= (1 << n)
-            
-            bit_index += 1
-            n -= 1
-
-            if bit_index >= len(metadata_bits):
-                current_bytes += 1
-                break
+    # Message bits go in subsequent frames
+    order = content_order(key, last_metadata_frame, len(table), is_random, is_scatter)
+    ranges = message_ranges(table, order, last_metadata_frame, last_metadata_bytes)
+    message_runs, placed, _, _ = plan_lsb_groups(ranges, message_bits, n_LSB)
+    runs += message_runs
+    if placed < len(message_bits) or runs_end(runs) > audio_size:
+        raise ValueError("Not enough space to embed content") # Also when a truncated last frame is reached
+    return runs
+
+def apply_runs(data, runs):
+    # Write every run into a uint8 array holding the whole file
+    for start, values, clear_mask in runs:
+        run = data[start:start+len(values)]
+        run &= ~clear_mask & 0xFF
+        run |= values
 
-            if n < 0:
-                n = n_LSB-1
-                current_bytes += 1
-        
-        if bit_index >= len(metadata_bits):
-            if (current_bytes >= data_end):
-                frame_index += 1
-                current_bytes = -1 # Start from next frame
-            last_metadata_frame = frame_index
-            last_metadata_bytes = current_bytes
+def stream_patched(audio_file, runs, chunk_size=STREAM_CHUNK_SIZE):
+    # Yield audio_file chunk by chunk with the runs that fall inside each chunk applied
+    runs = sorted(runs, key=lambda run: run[0])
+    run_index = 0
+    offset = 0
+    while True:
+        chunk = audio_file.read(chunk_size)
+        if not chunk:
             break
-        
-        frame_index += 1
-    else:
-        raise ValueError("Not enough space to embed metadata")
-    
-    # Embed message bits in subsequent frames
-    bit_index = 0 # Reset bit index for message
-    rand_index = generate_rand_index(key, last_metadata_frame, len(frames)) if is_random else 0 # Random start frame index [0, len_avail_frames]
-    n = n_LSB - 1
-
-    frame_index = 0 # For counting embedded frames for content
-    len_avail_frames = len(frames) - last_metadata_frame
-    while frame_index < len_avail_frames:
-        curr_frame_index = ((frame_index + rand_index) % len_avail_frames) + last_metadata_frame
-        frame_start, frame_size, has_crc = frames[curr_frame_index]
-        data_end = frame_start + frame_size
-        current_bytes = last_metadata_bytes if (last_metadata_bytes != -1 and last_metadata_frame == curr_frame_index) else frame_start + 4 + (2 if has_crc else 0)
+        buffer = bytearray(chunk)
+        view = np.frombuffer(buffer, dtype=np.uint8)
+        end = offset + len(buffer)
+
+        while run_index < len(runs) and runs[run_index][0] < end:
+            start, values, clear_mask = runs[run_index]
+            lo = max(start, offset)
+            hi = min(start + len(values), end)
+            run = view[lo-offset:hi-offset]
+            run &= ~clear_mask & 0xFF
+            run |= values[lo-start:hi-start]
+            if start + len(values) > end:
+                break # Continues in the next chunk
+            run_index += 1
+
+        yield bytes(buffer)
+        offset = end
+
+class ZipStreamBuffer:
+    # Write-only sink for zipfile; what has been written so far is handed out with take()
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
 
-        while current_bytes < data_end:
-            if message_bits[bit_index] == '0':
-                stego_data[current_bytes] &= ~(1 << n)
-            else:
-                stego_data[current_bytes] |= (1 << n)
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
 
-            bit_index += 1
-            n -= 1
+def stream_stego_zip(audio_file, entries, chunk_size=STREAM_CHUNK_SIZE):
+    # Yield a zip archive with one stego file per (name, runs) entry. Every member is streamed
+    # from the seekable cover through stream_patched, so only one chunk is in memory at a time.
+    # Members are stored uncompressed: MP3 data does not compress.
+    audio_size = audio_file.seek(0, os.SEEK_END)
+    sink = ZipStreamBuffer()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for name, runs in entries:
+            audio_file.seek(0)
+            with archive.open(name, "w", force_zip64=audio_size >= zipfile.ZIP64_LIMIT) as member:
+                for chunk in stream_patched(audio_file, runs, chunk_size):
+                    member.write(chunk)
+                    yield sink.take()
+    yield sink.take() # Central directory
 
-            if n < 0:
-                n = n_LSB - 1
-                current_bytes += 1
+### SHARDED EMBEDDING ENGINE ###
+# The content groups are cut into contiguous slices by group offset; capacity_before tells which
+# frames hold each slice, so shards group their bits and plan and write their frames without
+# looking at each other. The stego file and the message share one shared memory block; every
+# worker reads its part of the message from it and patches the audio in place.
+EMBED_SHARD_MIN_GROUPS = 1 << 20 # Fewer content groups per shard do not pay for the process round trip
 
-            if bit_index >= len(message_bits):
+def plan_content_shards(content, n_groups, shards, tail_bits):
+    # (group_start, group_end, starts, ends, tail_bits) per shard; only the last shard holds the short group
+    bounds = np.linspace(0, n_groups, shards + 1).astype(np.int64).tolist()
+    plans = []
+    for group_start, group_end in zip(bounds[:-1], bounds[1:]):
+        if group_end > group_start:
+            starts, ends = content_group_ranges(content, group_start, group_end)
+            plans.append((group_start, group_end, starts, ends, tail_bits if group_end == n_groups else 0))
+    return plans
+
+def embed_shard(buffer_name, audio_size, message_size, n_LSB, shard):
+    # Worker side: write content groups [group_start, group_end) of the message (stored after the
+    # audio in the shared buffer) into the shard's byte ranges of the audio
+    group_start, group_end, starts, ends, tail_bits = shard
+    block = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        buffer = np.ndarray(audio_size + message_size, dtype=np.uint8, buffer=block.buf)
+        bit_start = group_start * n_LSB
+        bit_end = min(group_end * n_LSB, message_size * 8)
+        message_bits = np.unpackbits(buffer[audio_size + bit_start // 8:audio_size + -(-bit_end // 8)])
+        values = bits_to_lsb_groups(message_bits[bit_start % 8:bit_start % 8 + bit_end - bit_start], n_LSB)
+        runs, _, _, _ = place_lsb_values(zip(starts.tolist(), ends.tolist()), values, n_LSB, tail_bits)
+        apply_runs(buffer, runs)
+        del buffer, runs
+    finally:
+        close_quietly(block)
+
+### EXTRACTION ENGINE ###
+def read_lsb_groups(data, ranges, n_bits, n_LSB):
+    # Gather the n_LSB low bits of the bytes covered by ranges until n_bits are collected,
+    # slicing one contiguous run at a time.
+    # Returns (0/1 bit array, index of the last range used, byte index after the last read byte)
+    groups = -(-n_bits // n_LSB)
+    runs = []
+    collected = 0
+    range_index = -1
+    next_bytes = -1
+    if groups > 0:
+        for range_index, (start, end) in enumerate(ranges):
+            count = min(end - start, groups - collected)
+            if count <= 0:
+                continue
+            next_bytes = start + count
+            runs.append(data[start:next_bytes])
+            collected += count
+            if collected == groups:
                 break
 
-        frame_index += 1
-        if bit_index >= len(message_bits):
-            break
+    values = np.concatenate(runs) if runs else np.zeros(0, dtype=np.uint8)
+    bits = lsb_groups_to_bits(values & ((1 << n_LSB) - 1), n_LSB)
+    return bits[:n_bits], range_index, next_bytes
+
+def read_content_bits(stego_view, content, bit_start, bit_end, n_LSB):
+    # Bits [bit_start, bit_end) of the content stream, touching only the frames that hold them
+    group_start = bit_start // n_LSB
+    group_end = -(-bit_end // n_LSB)
+    starts, ends = content_group_ranges(content, group_start, group_end)
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.uint8)
+
+    ranges = zip(starts.tolist(), ends.tolist())
+    bits, _, _ = read_lsb_groups(stego_view, ranges, (group_end - group_start) * n_LSB, n_LSB)
+    skip = bit_start - group_start * n_LSB
+    return bits[skip:skip + bit_end - bit_start]
+
+### METADATA ###
+def read_flags(stego_view, table):
+    # 2 bits for n_LSB, 1 bit for is_encrypt, 1 bit for is_random in the first payload byte
+    flags = int(stego_view[table["payload_start"][0]]) & 0xF
+    return (flags >> 2) + 1, (flags >> 1) & 1 == 1, flags & 1 == 1
+
+def read_message_length(stego_view, table, expect_len_bits, n_LSB):
+    # Returns (message length in bits, length field flags, frame where the content starts,
+    # byte where it starts or -1)
+    length_bits, last_metadata_frame, last_metadata_bytes = read_lsb_groups(stego_view, metadata_ranges(table), expect_len_bits, n_LSB)
+    if len(length_bits) < expect_len_bits:
+        raise ValueError("Not enough data to extract message length")
+    last_metadata_frame, last_metadata_bytes = content_start(table, last_metadata_frame, last_metadata_bytes)
+    length_field = int(''.join(map(str, length_bits.tolist())), 2)
+    length_flags = length_field & ((1 << LENGTH_FLAG_BITS) - 1)
+    return length_field - length_flags, length_flags, last_metadata_frame, last_metadata_bytes
+
+def read_stego_header(stego_view, table, n_LSB):
+    # Returns (message length in bits, header flags, CRC32, frame where the content starts,
+    # byte where it starts or -1), or None when the magic is not there
+    header_bits, last_metadata_frame, last_metadata_bytes = read_lsb_groups(stego_view, metadata_ranges(table), STEGO_HEADER_BITS, n_LSB)
+    if len(header_bits) < STEGO_HEADER_BITS:
+        return None
+    magic, version, header_flags, length, checksum = STEGO_HEADER.unpack(np.packbits(header_bits).tobytes())
+    if magic != STEGO_MAGIC:
+        return None
+    if version != STEGO_VERSION:
+        raise ValueError(f"Unsupported stego header version: {version}")
+    return (length * 8, header_flags, checksum, *content_start(table, last_metadata_frame, last_metadata_bytes))
+
+def read_stego_metadata(stego_view, table, payload_bytes, key=""):
+    # Returns (n_LSB, is_encrypt, compression codec, message length in bits, CRC32 or None for
+    # version 1 files, content frame table)
+    n_LSB, is_encrypt, is_random = read_flags(stego_view, table)
+    logger.debug("n_LSB: %d, is_encrypt: %s, is_random: %s", n_LSB, is_encrypt, is_random)
+
+    header = read_stego_header(stego_view, table, n_LSB)
+    if header is not None:
+        message_length, header_flags, checksum, last_metadata_frame, last_metadata_bytes = header
+    elif LEGACY_HEADERS:
+        max_message = payload_bytes * n_LSB
+        message_length, header_flags, last_metadata_frame, last_metadata_bytes = read_message_length(stego_view, table, max_message.bit_length(), n_LSB)
+        checksum = None
+        if header_flags or message_length == 0:
+            raise ValueError("No hidden message found") # Field no version 1 writer produces
     else:
-        raise ValueError("Not enough space to embed content")
+        raise ValueError("No hidden message found")
+    is_scatter = header_flags & HEADER_FLAG_SCATTER != 0
+    compression = codec_name((header_flags & HEADER_FLAG_CODEC) >> HEADER_FLAG_CODEC_SHIFT)
+    logger.debug("Message length (bits): %d, is_scatter: %s, compression: %s", message_length, is_scatter, compression)
 
-    return bytes(stego_data)
+    order = content_order(key, last_metadata_frame, len(table), is_random, is_scatter)
+    content = content_table(table, order, last_metadata_frame, last_metadata_bytes)
+    if message_length > table_payload_bytes(content) * n_LSB:
+        raise ValueError("No hidden message found") # Length read from a clean file, before touching the content
+    return n_LSB, is_encrypt, compression, message_length, checksum, content
 
-def extract_message(stego_path, key=""):
-    with open(stego_path, 'rb') as f:
-        audio_data = f.read()
+def verify_checksum(message_bytes, checksum):
+    if checksum is not None and zlib.crc32(message_bytes) != checksum:
+        raise ValueError("Payload checksum mismatch: wrong key or corrupted file")
 
-    frames = get_audio_frames(audio_data)
-    if not frames:
+### MAIN FUNCTIONS ###
+MIME_SNIFF_BYTES = 1 << 14 # libmagic only needs the head of the payload to tell its type
+def plan_message_embedding(table, payload_bytes, message, audio_size, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    if len(table) == 0:
         raise ValueError("No valid MP3 frames found")
-    
-    stego_data = bytearray(audio_data)
-    
-    padding_bit = 4 # 2 bits for n_LSB, 1 bit for is_encrypt, 1 bit for is_random
-    frame_index = 0
 
-    # Get Flag & LSB Info
-    frame_start, frame_size, has_crc = frames[frame_index]
-    current_bytes = frame_start + 4 + (2 if has_crc else 0)
-    flag_bits = format(stego_data[current_bytes] & ((1 << (padding_bit)) - 1), '04b')
-    current_bytes += 1
+    with stage("preprocess"):
+        metadata_bits, message = preprocess_message_bytes(message, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+        message_bits = np.unpackbits(np.frombuffer(message, dtype=np.uint8))
+    with stage("plan"):
+        return plan_embedding(table, payload_bytes, metadata_bits, message_bits, audio_size, key, is_random, n_LSB, is_scatter)
 
-    n_LSB = int(flag_bits[:2], 2) + 1
-    is_encrypt = flag_bits[2] == '1'
-    is_random = flag_bits[3] == '1'
+def embed_message(audio_path, message_path, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    with map_file(audio_path) as audio_data:
+        return embed_message_bytes(audio_data, read_file(message_path), is_encrypt, key, is_random, n_LSB, is_scatter, compression)
 
-    print(f"n_LSB: {n_LSB}, is_encrypt: {is_encrypt}, is_random: {is_random}")
+def embed_message_bytes(audio_data, message, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    # audio_data and message can be bytes or any buffer (bytearray, memoryview, mmap)
+    table, payload_bytes = get_frame_index(audio_data)
+    runs = plan_message_embedding(table, payload_bytes, message, len(audio_data), is_encrypt, key, is_random, n_LSB, is_scatter, compression)
 
-    # Get message length info
-    message_length_bits = ''
-    max_message = calc_max_message(frames, n_LSB)
-    expect_len_bits = max_message.bit_length()
+    with stage("write"):
+        stego_data = bytearray(audio_data)
+        apply_runs(np.frombuffer(stego_data, dtype=np.uint8), runs)
+        return bytes(stego_data)
 
-    while frame_index < len(frames):
-        frame_start, frame_size, has_crc = frames[frame_index]
-        data_end = frame_start + frame_size
-        current_bytes = frame_start + 4 + (2 if has_crc else 0)
+def embed_message_file(audio_path, message_path, output_path, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none"):
+    # Embed into output_path without loading either audio file: the cover is copied once by the
+    # OS, then payload bytes are patched in place through a writable mapping of the copy
+    message = read_file(message_path)
+    shutil.copyfile(audio_path, output_path)
+    try:
+        with map_file(output_path, writable=True) as stego_data:
+            table, payload_bytes = get_frame_index(stego_data)
+            runs = plan_message_embedding(table, payload_bytes, message, len(stego_data), is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+            stego_view = np.frombuffer(stego_data, dtype=np.uint8)
+            apply_runs(stego_view, runs)
+            del stego_view
+            stego_data.flush()
+    except Exception:
+        os.remove(output_path)
+        raise
 
-        while current_bytes < data_end:
-            message_length_bits += format(stego_data[current_bytes] & ((1 << n_LSB) - 1), f'0{n_LSB}b')
+def embed_message_stream(audio_file, message, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none", chunk_size=STREAM_CHUNK_SIZE):
+    # Streaming embed for a seekable cover file: one chunked pass builds the frame table, then
+    # the returned generator re-reads the cover and yields the stego file chunk by chunk.
+    # Memory stays at one chunk plus the frame table and the message, whatever the cover length.
+    audio_file.seek(0)
+    table = get_frame_table_stream(audio_file, chunk_size)
+    audio_size = audio_file.seek(0, os.SEEK_END)
+    runs = plan_message_embedding(table, table_payload_bytes(table), message, audio_size, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
 
-            current_bytes += 1
-            if len(message_length_bits)-n_LSB >= expect_len_bits:
-                break
+    audio_file.seek(0)
+    return stream_patched(audio_file, runs, chunk_size)
 
-        if len(message_length_bits)-n_LSB >= expect_len_bits:
-            if (current_bytes >= data_end):
-                frame_index += 1
-                current_bytes = -1 # Start from next frame
-            last_metadata_frame = frame_index
-            last_metadata_bytes = current_bytes
-            break
-        frame_index += 1
+@contextmanager
+def sharded_stego(audio_data, message, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none", processes=None):
+    # The stego file as an array in shared memory, with the content planned and written by a
+    # process pool (see SHARDED EMBEDDING ENGINE); None when the message is too small to split.
+    # Compression can shrink the message, so the shard count is settled after preprocessing.
+    processes = processes or os.cpu_count() or 1
+    shards = min(processes, -(-len(message) * 8 // n_LSB) // EMBED_SHARD_MIN_GROUPS)
+    if shards < 2:
+        yield None
+        return
 
-    if len(message_length_bits)-n_LSB < expect_len_bits:
-        raise ValueError("Not enough data to extract message length")
-    
-    message_length = int(message_length_bits[n_LSB:expect_len_bits+n_LSB], 2)
-    print("Message Length (bits):", message_length)
-
-    # Get message bits
-    message_bits = ''
-    rand_index = generate_rand_index(key, last_metadata_frame, len(frames)) if is_random else 0 # Random start frame index [0, len_avail_frames]
-    n = n_LSB - 1
-
-    frame_index = 0 # For counting embedded frames for content
-    len_avail_frames = len(frames) - last_metadata_frame + 1
-    while frame_index < len_avail_frames:
-        curr_frame_index = ((frame_index + rand_index) % len_avail_frames) + last_metadata_frame
-        frame_start, frame_size, has_crc = frames[curr_frame_index]
-        data_end = frame_start + frame_size
-        current_bytes = last_metadata_bytes if (last_metadata_bytes != -1 and last_metadata_frame == curr_frame_index) else frame_start + 4 + (2 if has_crc else 0)
+    table, payload_bytes = get_frame_index(audio_data)
+    if len(table) == 0:
+        raise ValueError("No valid MP3 frames found")
+    audio_size = len(audio_data)
 
-        while current_bytes < data_end:
-            message_bits += format(stego_data[current_bytes] & ((1 << n_LSB) - 1), f'0{n_LSB}b')
+    with stage("preprocess"):
+        metadata_bits, message = preprocess_message_bytes(message, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+    with stage("plan"):
+        message_bit_count = len(message) * 8
+        runs, last_metadata_frame, last_metadata_bytes = plan_metadata(table, payload_bytes, metadata_bits, message_bit_count, n_LSB)
+        order = content_order(key, last_metadata_frame, len(table), is_random, is_scatter)
+        content = content_table(table, order, last_metadata_frame, last_metadata_bytes)
+        n_groups = -(-message_bit_count // n_LSB)
+        shards = max(min(shards, n_groups // EMBED_SHARD_MIN_GROUPS), 1)
+        if n_groups > table_payload_bytes(content):
+            raise ValueError("Not enough space to embed content")
+        last_frame = int(np.searchsorted(content["capacity_before"], n_groups - 1, side="right")) - 1
+        last_byte = int(content["payload_start"][last_frame] + n_groups - 1 - content["capacity_before"][last_frame])
+        content_end = max(last_byte + 1, int(content["payload_end"][:last_frame].max(initial=0)))
+        if max(runs_end(runs), content_end) > audio_size:
+            raise ValueError("Not enough space to embed content") # A used frame is truncated
+        plans = plan_content_shards(content, n_groups, shards, n_groups*n_LSB - message_bit_count)
 
-            if len(message_bits) >= message_length:
-                break
-            current_bytes += 1
-        
-        if len(message_bits) >= message_length:
-            break
-        frame_index += 1
-        
-    if len(message_bits) < message_length:
-        raise ValueError("Not enough data to extract message content")
+    block = shared_memory.SharedMemory(create=True, size=audio_size + len(message))
+    try:
+        with stage("write"):
+            buffer = np.ndarray(audio_size + len(message), dtype=np.uint8, buffer=block.buf)
+            buffer[:audio_size] = np.frombuffer(audio_data, dtype=np.uint8)
+            buffer[audio_size:] = np.frombuffer(message, dtype=np.uint8)
+            apply_runs(buffer, runs)
+            with ProcessPoolExecutor(max_workers=len(plans)) as executor:
+                list(executor.map(embed_shard, repeat(block.name), repeat(audio_size), repeat(len(message)), repeat(n_LSB), plans))
+        yield buffer[:audio_size]
+        del buffer
+    finally:
+        close_quietly(block)
+        block.unlink()
+
+def embed_message_parallel(audio_data, message, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none", processes=None):
+    # embed_message_bytes for large covers, through sharded_stego. Falls back to embed_message_bytes
+    # when the message is too small to split. The output is byte-identical either way; it is
+    # copied once out of shared memory.
+    with sharded_stego(audio_data, message, is_encrypt, key, is_random, n_LSB, is_scatter, compression, processes) as stego_view:
+        if stego_view is not None:
+            stego_data = bytes(stego_view)
+            del stego_view
+            return stego_data
+    return embed_message_bytes(audio_data, message, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+
+def embed_message_parallel_file(audio_path, message_path, output_path, is_encrypt=False, key="", is_random=False, n_LSB=1, is_scatter=False, compression="none", processes=None):
+    # embed_message_file for large covers: the cover is mapped, not loaded, and the output written
+    # straight from shared memory. Falls back to embed_message_file for small messages.
+    message = read_file(message_path)
+    with map_file(audio_path) as audio_data:
+        with sharded_stego(audio_data, message, is_encrypt, key, is_random, n_LSB, is_scatter, compression, processes) as stego_view:
+            if stego_view is not None:
+                write_file(output_path, stego_view)
+                del stego_view
+                return
+    embed_message_file(audio_path, message_path, output_path, is_encrypt, key, is_random, n_LSB, is_scatter, compression)
+
+def plan_message_batch(table, payload_bytes, audio_size, jobs):
+    # Runs for every job against one frame table. A job is a dict with the zip member "name",
+    # the "message" and optionally the embed_message_bytes options (is_encrypt, key, is_random, n_LSB,
+    # is_scatter, compression).
+    plans = []
+    for job in jobs:
+        try:
+            plans.append(plan_message_embedding(table, payload_bytes, job["message"], audio_size,
+                                                job.get("is_encrypt", False), job.get("key", ""),
+                                                job.get("is_random", False), job.get("n_LSB", 1), job.get("is_scatter", False),
+                                                job.get("compression", "none")))
+        except ValueError as e:
+            raise ValueError(f"{job['name']}: {e}") from e
+    return plans
+
+def embed_message_batch(audio_path, jobs, output_path, chunk_size=STREAM_CHUNK_SIZE, processes=None):
+    # Embed many messages into one cover and write the stego files as a zip archive.
+    # The cover is parsed once; each job only costs its planning plus one copy of the cover.
+    # Planning is split over a process pool (as /embed/batch does); the zip is written in order.
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    with map_file(audio_path) as audio_data:
+        table, payload_bytes = get_frame_index(audio_data)
+        audio_size = len(audio_data)
+    if len(table) == 0:
+        raise ValueError("No valid MP3 frames found")
+    if processes <= 1:
+        plans = plan_message_batch(table, payload_bytes, audio_size, jobs)
+    else:
+        groups = [jobs[i::processes] for i in range(processes)]
+        plans = [None] * len(jobs)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            group_plans = executor.map(plan_message_batch, repeat(table), repeat(payload_bytes), repeat(audio_size), groups)
+            for i, group_plan in enumerate(group_plans):
+                plans[i::processes] = group_plan
+
+    try:
+        with open(audio_path, "rb") as audio_file, open(output_path, "wb") as output_file:
+            for data in stream_stego_zip(audio_file, zip((job["name"] for job in jobs), plans), chunk_size):
+                output_file.write(data)
+    except Exception:
+        os.remove(output_path)
+        raise
+
+def extract_message(stego_path, key=""):
+    # Reads straight from a read-only mapping of the stego file
+    with map_file(stego_path) as stego_data:
+        return extract_message_bytes(stego_data, key)
+
+def extract_message_bytes(stego_data, key=""):
+    # stego_data can be bytes or any buffer (bytearray, memoryview, mmap)
+    table, payload_bytes = get_frame_index(stego_data)
+    if len(table) == 0:
+        raise ValueError("No valid MP3 frames found")
     
-    message_bytes = get_message_bytes(message_bits[:message_length], is_encrypt, key)
-    mime_type = get_mime_type(message_bytes)
-    extension = get_extension_from_mime(mime_type)
+    with stage("read"):
+        stego_view = np.frombuffer(stego_data, dtype=np.uint8)
+        n_LSB, is_encrypt, compression, message_length, checksum, content = read_stego_metadata(stego_view, table, payload_bytes, key)
+        message_bits = read_content_bits(stego_view, content, 0, message_length, n_LSB)
+        if len(message_bits) < message_length:
+            raise ValueError("Not enough data to extract message content")
+    
+    with stage("decode"):
+        message_bytes = get_message_bytes(message_bits, is_encrypt, key)
+    if compression != "none":
+        with stage("decompress"):
+            message_bytes = b"".join(iter_decompressed(iter_chunks(message_bytes), compression))
+    with stage("verify"):
+        verify_checksum(message_bytes, checksum)
+    with stage("mime"):
+        mime_type = get_mime_type(message_bytes[:MIME_SNIFF_BYTES])
+        extension = get_extension_from_mime(mime_type)
 
-    print("Extracted Message:", message_bytes)
-    print("MIME Type:", mime_type)
-    print("File Extension:", extension)
+    # The payload itself is never logged, only its size
+    logger.debug("Extracted %d bytes, MIME type %s, extension %s", len(message_bytes), mime_type, extension)
 
     return {
         "data": message_bytes,
@@ -252,7 +806,274 @@ def extract_message(stego_path, key=""):
         "extension": extension
     }
 
+def extract_message_range(stego_path, start=0, end=None, key=""):
+    # Only the pages of the mapping that hold the requested bytes are read from disk
+    with map_file(stego_path) as stego_data:
+        return extract_message_range_bytes(stego_data, start, end, key)
+
+def extract_message_range_bytes(stego_data, start=0, end=None, key=""):
+    # Bytes [start, end) of the hidden payload, clamped like a slice (negative values count from
+    # the end), reading only the frames that hold them. An encrypted payload is read from byte 0:
+    # autokey decryption of a byte depends on every byte before it. Offsets into a compressed
+    # payload count decompressed bytes, so it is read whole and decompressed first.
+    # The MIME type is sniffed from the first MIME_SNIFF_BYTES of the payload.
+    table, payload_bytes = get_frame_index(stego_data)
+    if len(table) == 0:
+        raise ValueError("No valid MP3 frames found")
+
+    with stage("read"):
+        stego_view = np.frombuffer(stego_data, dtype=np.uint8)
+        n_LSB, is_encrypt, compression, message_length, checksum, content = read_stego_metadata(stego_view, table, payload_bytes, key)
+        total_size = message_length // 8
+        if compression == "none":
+            start, end, _ = slice(start, end).indices(total_size)
+            end = max(start, end)
+            head_end = min(MIME_SNIFF_BYTES, total_size)
+
+            # One read when the range and the head overlap, otherwise the head is read on its own
+            read_start = 0 if (is_encrypt and key) or start <= head_end else start
+            read_end = max(end, head_end) if read_start == 0 else end
+        else:
+            head_end = read_end = total_size
+            read_start = 0
+        bits = read_content_bits(stego_view, content, 8 * read_start, 8 * read_end, n_LSB)
+        head_bits = bits if read_start == 0 else read_content_bits(stego_view, content, 0, 8 * head_end, n_LSB)
+        if len(bits) < 8 * (read_end - read_start) or len(head_bits) < 8 * head_end:
+            raise ValueError("Not enough data to extract message content")
+
+    with stage("decode"):
+        message_bytes = get_message_bytes(bits, is_encrypt, key)
+        head = message_bytes[:head_end] if read_start == 0 else get_message_bytes(head_bits, is_encrypt, key)
+    if compression != "none":
+        with stage("decompress"):
+            message_bytes = b"".join(iter_decompressed(iter_chunks(message_bytes), compression))
+        total_size = len(message_bytes)
+        start, end, _ = slice(start, end).indices(total_size)
+        end = max(start, end)
+        head = message_bytes[:MIME_SNIFF_BYTES]
+    if read_start == 0 and len(message_bytes) == total_size:
+        with stage("verify"):
+            verify_checksum(message_bytes, checksum) # Only when the whole payload was read anyway
+    with stage("mime"):
+        mime_type = get_mime_type(head)
+        extension = get_extension_from_mime(mime_type)
+
+    return {
+        "data": message_bytes[start - read_start:end - read_start],
+        "mime_type": mime_type,
+        "extension": extension,
+        "start": start,
+        "end": end,
+        "total_size": total_size
+    }
+
+def calc_capacity(payload_bytes, n_LSB=1):
+    # Largest message size (bytes) that passes embed_message's capacity check: one flag byte,
+    # the stego header and then the content
+    free_bytes = payload_bytes - 1 - (STEGO_HEADER_BITS + (n_LSB-1))//n_LSB
+    return max(free_bytes * n_LSB // 8, 0)
+
+def get_capacity(audio_data, message_size=None):
+    # Capacity for every n_LSB from a single (cached) frame scan, plus the smallest n_LSB that fits message_size
+    table, payload_bytes = get_frame_index(audio_data)
+    if len(table) == 0:
+        raise ValueError("No valid MP3 frames found")
+
+    capacity = {n_LSB: calc_capacity(payload_bytes, n_LSB) for n_LSB in range(1, 5)}
+    recommended = None
+    if message_size is not None:
+        recommended = next((n_LSB for n_LSB in capacity if message_size <= capacity[n_LSB]), None)
+    return capacity, recommended
+
+INSPECT_HEAD_BYTES = 1 << 16 # First read when inspecting; grown only if the leading frames are not in it
+INSPECT_PROBE_FRAMES = 8
+INSPECT_ESTIMATE_MARGIN = 0.04 # Relative error tolerated when estimating the payload total from the head
+
+def estimate_payload_bytes(frames, audio_size):
+    # Total payload bytes if the rest of the file is made of frames like the probed ones
+    frame_bytes = sum(frame_size for _, frame_size, _ in frames)
+    payload = sum(frame_size - 4 - (2 if has_crc else 0) for _, frame_size, has_crc in frames)
+    return payload / frame_bytes * (audio_size - frames[0][0])
+
+def find_audio_end(audio_file, audio_size, tail_start):
+    # Trailing tags (ID3v1, APE, ...) are not frames, so find where the last frame ends by
+    # parsing the file from tail_start on. Returns (audio end or None, bytes read)
+    audio_file.seek(tail_start)
+    tail = audio_file.read(audio_size - tail_start)
+    tail_frames = get_audio_frames(tail)
+    if len(tail_frames) < 2:
+        return None, len(tail)
+    return tail_start + tail_frames[-1][0] + tail_frames[-1][1], len(tail)
+
+def inspect_message(audio_file, head_bytes=INSPECT_HEAD_BYTES):
+    # Stego flags and message length of a seekable file, reading only its first frames. For version 1
+    # files the length field width depends on the capacity of the whole file, which is estimated
+    # from the probed frames; when the estimate is too close to a power of two the file is read
+    # and parsed fully.
+    audio_size = audio_file.seek(0, os.SEEK_END)
+    audio_file.seek(0)
+    head = audio_file.read(head_bytes)
+    while True:
+        frames = list(islice(iter_audio_frames(head), INSPECT_PROBE_FRAMES + 1))
+        if len(frames) > INSPECT_PROBE_FRAMES or len(head) >= audio_size:
+            break
+        head += audio_file.read(3 * len(head)) # Leading junk (e.g. cover art); look further
+    if not frames:
+        raise ValueError("No valid MP3 frames found")
+
+    stego_view = np.frombuffer(head, dtype=np.uint8)
+    probe_table = frame_table_from_list(frames[:INSPECT_PROBE_FRAMES])
+    n_LSB, is_encrypt, is_random = read_flags(stego_view, probe_table)
+
+    bytes_read = len(head)
+    header = read_stego_header(stego_view, probe_table, n_LSB)
+    if header is not None:
+        message_length, header_flags, checksum, _, _ = header
+        return inspect_result(n_LSB, is_encrypt, is_random, STEGO_VERSION, header_flags, message_length, checksum, bytes_read)
+    if not LEGACY_HEADERS:
+        raise ValueError("No hidden message found")
+
+    expect_len_bits = None
+    if len(head) < audio_size:
+        audio_end, tail_read = find_audio_end(audio_file, audio_size, max(audio_size - head_bytes, len(head)))
+        bytes_read += tail_read
+        audio_file.seek(len(head))
+        if audio_end is not None:
+            estimate = estimate_payload_bytes(frames[:INSPECT_PROBE_FRAMES], min(audio_end, audio_size)) * n_LSB
+            low = int(estimate * (1 - INSPECT_ESTIMATE_MARGIN)).bit_length()
+            high = int(estimate * (1 + INSPECT_ESTIMATE_MARGIN)).bit_length()
+            if low == high:
+                expect_len_bits = low
+    message_length = None
+    if expect_len_bits is not None:
+        try:
+            message_length, header_flags, _, _ = read_message_length(stego_view, probe_table, expect_len_bits, n_LSB)
+        except ValueError:
+            pass # Length field runs past the probed frames
+    if message_length is None:
+        # Exact path: parse the whole file
+        head += audio_file.read()
+        table, payload_bytes = get_frame_index(head)
+        stego_view = np.frombuffer(head, dtype=np.uint8)
+        message_length, header_flags, _, _ = read_message_length(stego_view, table, (payload_bytes * n_LSB).bit_length(), n_LSB)
+        bytes_read = len(head)
+    if header_flags or message_length == 0:
+        raise ValueError("No hidden message found")
+    return inspect_result(n_LSB, is_encrypt, is_random, 1, header_flags, message_length, None, bytes_read)
+
+def inspect_result(n_LSB, is_encrypt, is_random, version, header_flags, message_length, checksum, bytes_read):
+    return {
+        "n_LSB": n_LSB,
+        "is_encrypt": is_encrypt,
+        "is_random": is_random,
+        "is_scatter": header_flags & HEADER_FLAG_SCATTER != 0,
+        "compression": codec_name((header_flags & HEADER_FLAG_CODEC) >> HEADER_FLAG_CODEC_SHIFT),
+        "version": version,
+        "message_length": message_length,
+        "checksum": checksum,
+        "bytes_read": bytes_read
+    }
+
+### BATCH EXTRACTION ###
+def iter_stego_archive(archive_file):
+    # (name, bytes) of every regular file in a seekable zip or tar archive, read lazily
+    if zipfile.is_zipfile(archive_file):
+        archive = zipfile.ZipFile(archive_file)
+        return ((info.filename, archive.read(info)) for info in archive.infolist() if not info.is_dir())
+    archive_file.seek(0)
+    try:
+        archive = tarfile.open(fileobj=archive_file, mode="r:*")
+    except tarfile.TarError:
+        raise ValueError("Unsupported archive, expected zip or tar")
+    return ((member.name, archive.extractfile(member).read()) for member in archive if member.isfile())
+
+def iter_stego_path(path):
+    # (name, path) for every file below a directory, or (name, bytes) for the files of an archive
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                yield os.path.relpath(file_path, path), file_path
+    else:
+        with open(path, "rb") as archive_file:
+            yield from iter_stego_archive(archive_file)
+
+def extract_message_entry(source, key=""):
+    # extract_message for a path, extract_message_bytes for bytes; a failure is returned
+    # instead of raised so that one bad file does not stop a batch
+    try:
+        if isinstance(source, str):
+            result = extract_message(source, key)
+        else:
+            result = extract_message_bytes(source, key)
+    except Exception as e:
+        return {"error": str(e)}
+    result["data"] = bytes(result["data"])
+    return result
+
+class ExtractResultArchive:
+    # Zip of extracted payloads followed by manifest.json, built one file at a time.
+    # take() returns the archive bytes produced so far.
+    def __init__(self):
+        self.sink = ZipStreamBuffer()
+        self.archive = zipfile.ZipFile(self.sink, "w", zipfile.ZIP_STORED)
+        self.manifest = []
+        self.names = set()
+
+    def output_name(self, name, extension):
+        # Archive member names may hold absolute or ".." parts; keep only the safe ones
+        parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+        stem = os.path.splitext("/".join(parts) or "payload")[0]
+        output = stem + extension
+        n = 1
+        while output in self.names:
+            n += 1
+            output = f"{stem}_{n}{extension}"
+        self.names.add(output)
+        return output
+
+    def add(self, name, result):
+        if "error" in result:
+            self.manifest.append({"file": name, "status": "error", "error": result["error"]})
+            return
+        output = self.output_name(name, result["extension"])
+        self.archive.writestr(output, result["data"])
+        self.manifest.append({
+            "file": name,
+            "status": "success",
+            "output": output,
+            "mime_type": result["mime_type"],
+            "extension": result["extension"],
+            "size": len(result["data"])
+        })
+
+    def close(self):
+        self.archive.writestr("manifest.json", json.dumps(self.manifest, indent=2), zipfile.ZIP_DEFLATED)
+        self.archive.close()
+
+    def take(self):
+        return self.sink.take()
+
+def extract_message_batch(source, output_path, key="", processes=None):
+    # Extract every stego file of a directory, zip or tar into a result archive at output_path,
+    # spread over a process pool. At most two files per process are in flight, so archives
+    # larger than memory are fine. Returns the manifest.
+    processes = processes or os.cpu_count() or 1
+    results = ExtractResultArchive()
+    with ProcessPoolExecutor(max_workers=processes) as executor, open(output_path, "wb") as output_file:
+        submit = lambda item: executor.submit(extract_message_entry, item[1], key)
+        for (name, _), future in iter_bounded(submit, iter_stego_path(source), 2 * processes):
+            results.add(name, future.result())
+            output_file.write(results.take())
+        results.close()
+        output_file.write(results.take())
+    return results.manifest
+
 def calc_max_message(frames, n_LSB=1):
+    # frames is a frame table or a list of (offset, size, has_crc) tuples
+    if isinstance(frames, np.ndarray):
+        return table_payload_bytes(frames) * n_LSB
     total_bytes = 0
     for frame_start, frame_size, has_crc in frames:
         data_start = frame_start + 4 + (2 if has_crc else 0)
@@ -0,0 +1,79 @@
+### WORKER POOL ###
+# Steganography and PSNR work is CPU bound, so it runs in worker processes instead of on the
+# event loop. Jobs beyond the pending limit are refused straight away so the caller can answer 503.
+import asyncio
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", os.cpu_count() or 1))
+WORKER_MAX_PENDING = int(os.environ.get("WORKER_MAX_PENDING", 4 * WORKER_PROCESSES)) # Running + queued jobs
+WORKER_TIMEOUT = float(os.environ.get("WORKER_TIMEOUT", 120)) # Seconds a request waits for its job
+
+class PoolBusy(Exception):
+    pass
+
+class WorkerPool:
+    def __init__(self, processes=WORKER_PROCESSES, max_pending=WORKER_MAX_PENDING, timeout=WORKER_TIMEOUT):
+        self.processes = max(processes, 1)
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _release(self, future):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        # Run fn(*args, **kwargs) in a worker process; raises PoolBusy when saturated and
+        # asyncio.TimeoutError after timeout seconds (a job that already started keeps its slot until it ends)
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise PoolBusy("Worker pool is saturated")
+            self.pending += 1
+        try:
+            self.start()
+            future = self.executor.submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            with self.lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except BrokenProcessPool:
+            self.shutdown() # A worker died (e.g. out of memory); start a fresh pool next time
+            raise
+
+    def stats(self):
+        with self.lock:
+            return {"processes": self.processes, "pending": self.pending, "max_pending": self.max_pending}
+
+worker_pool = WorkerPool()
+
+def iter_bounded(submit, items, window):
+    # (item, future) for every item in input order, where submit(item) starts its job and returns
+    # a future. Only window jobs are started ahead, so items can be a lazy iterator larger than
+    # memory, provided each future is resolved before the next pair is taken.
+    pending = deque()
+    for item in items:
+        pending.append((item, submit(item)))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
@@ -0,0 +1,177 @@
+### STEGO TRIAGE SCANNER ###
+# Sweeps directories for MP3s that carry a payload from this tool, reading only the leading frames
+# of each file: the flag nibble and the stego header (or a version 1 length field) are checked
+# against the capacity estimated from those frames. Writes one JSON line per file.
+# Run from backend/: python -m app.scan <dir> [<dir> ...] [--output report.jsonl]
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import numpy as np
+from app.compress import COMPRESSION_CODECS
+from app.pool import iter_bounded
+from app.new import iter_audio_frames, frame_table_from_list, read_flags, read_stego_header, read_message_length
+from app.new import estimate_payload_bytes, find_audio_end, get_frame_table, table_payload_bytes, calc_capacity, LEGACY_HEADERS
+from app.new import INSPECT_PROBE_FRAMES, INSPECT_ESTIMATE_MARGIN, HEADER_FLAG_SCATTER, HEADER_FLAG_CODEC, HEADER_FLAG_CODEC_SHIFT
+
+SCAN_HEAD_BYTES = 1 << 14 # First read per file; eight frames of any bitrate fit in it
+SCAN_MAX_HEAD_BYTES = 1 << 22 # Give up on files whose leading junk (e.g. cover art) is longer
+SCAN_BATCH_FILES = 64 # Files per pool task, so scheduling costs little next to the reads
+SCAN_EXTENSIONS = (".mp3",)
+
+def read_head(path, head_bytes=SCAN_HEAD_BYTES, max_head_bytes=SCAN_MAX_HEAD_BYTES):
+    # (file size, leading bytes, up to INSPECT_PROBE_FRAMES + 1 leading frames). The head grows
+    # only while leading junk hides the frames.
+    with open(path, "rb") as f:
+        audio_size = os.fstat(f.fileno()).st_size
+        head = f.read(min(head_bytes, max_head_bytes))
+        while True:
+            frames = list(islice(iter_audio_frames(head), INSPECT_PROBE_FRAMES + 1))
+            if len(frames) > INSPECT_PROBE_FRAMES or len(head) >= min(audio_size, max_head_bytes):
+                return audio_size, head, frames
+            head += f.read(min(3 * len(head), max_head_bytes - len(head)))
+
+def read_audio_end(path, audio_size, head_size, head_bytes=SCAN_HEAD_BYTES):
+    # (end of the last frame or None, bytes read), from the last head_bytes of the file
+    with open(path, "rb") as f:
+        return find_audio_end(f, audio_size, max(audio_size - head_bytes, head_size))
+
+def scan_file(path, legacy=LEGACY_HEADERS, head_bytes=SCAN_HEAD_BYTES):
+    # Report for one file. status is one of
+    #   stego   a version 2 header whose length fits the capacity
+    #   legacy  no header, but a version 1 length field that fits with its low 3 bits clear, as
+    #           version 1 writers left them (a clean file passes this by chance about once in 16)
+    #   invalid a header whose length or flags no embedding could produce
+    #   unknown the capacity estimate is too coarse to read a version 1 length field, or the
+    #           frames end in a trailing tag longer than head_bytes
+    #   clean, not_mp3, error
+    # Only the head is read for version 2 files; the tail is read to find where the frames end
+    # when a version 1 length field has to be sized.
+    result = {"path": path}
+    try:
+        audio_size, head, frames = read_head(path, head_bytes)
+    except OSError as e:
+        return dict(result, status="error", error=str(e))
+    result.update(size=audio_size, bytes_read=len(head))
+    if not frames:
+        return dict(result, status="not_mp3")
+
+    probe = frames[:INSPECT_PROBE_FRAMES]
+    stego_view = np.frombuffer(head, dtype=np.uint8)
+    probe_table = frame_table_from_list(probe)
+    n_LSB, is_encrypt, is_random = read_flags(stego_view, probe_table)
+    if len(head) >= audio_size:
+        payload_estimate = table_payload_bytes(get_frame_table(head)) # Whole file read: exact
+    else:
+        payload_estimate = estimate_payload_bytes(probe, audio_size) # Trailing tags only raise it
+
+    header = read_stego_header(stego_view, probe_table, n_LSB)
+    if header is not None:
+        message_length, header_flags, checksum, _, _ = header
+        version = 2
+    elif legacy:
+        if len(head) < audio_size:
+            try:
+                audio_end, tail_read = read_audio_end(path, audio_size, len(head), head_bytes)
+            except OSError as e:
+                return dict(result, status="error", error=str(e))
+            result["bytes_read"] += tail_read
+            if audio_end is None:
+                return dict(result, status="unknown")
+            payload_estimate = estimate_payload_bytes(probe, audio_end)
+        low = int(payload_estimate * n_LSB * (1 - INSPECT_ESTIMATE_MARGIN)).bit_length()
+        high = int(payload_estimate * n_LSB * (1 + INSPECT_ESTIMATE_MARGIN)).bit_length()
+        if low != high:
+            return dict(result, status="unknown")
+        try:
+            message_length, header_flags, _, _ = read_message_length(stego_view, probe_table, low, n_LSB)
+        except ValueError:
+            return dict(result, status="unknown") # Length field runs past the probed frames
+        checksum = None
+        version = 1
+    else:
+        return dict(result, status="clean")
+
+    capacity = calc_capacity(int(payload_estimate * (1 + INSPECT_ESTIMATE_MARGIN)), n_LSB)
+    codec = (header_flags & HEADER_FLAG_CODEC) >> HEADER_FLAG_CODEC_SHIFT
+    fits = message_length // 8 <= capacity and codec < len(COMPRESSION_CODECS)
+    if version == 1 and (not fits or message_length == 0 or header_flags):
+        return dict(result, status="clean")
+    result.update(
+        status="stego" if version == 2 and fits else "legacy" if fits else "invalid",
+        version=version,
+        n_LSB=n_LSB,
+        is_encrypt=is_encrypt,
+        is_random=is_random,
+        is_scatter=header_flags & HEADER_FLAG_SCATTER != 0,
+        compression=COMPRESSION_CODECS[codec] if codec < len(COMPRESSION_CODECS) else None,
+        message_size=message_length // 8,
+        capacity=capacity,
+        checksum=checksum,
+    )
+    return result
+
+def scan_files(paths, legacy=LEGACY_HEADERS, head_bytes=SCAN_HEAD_BYTES):
+    return [scan_file(path, legacy, head_bytes) for path in paths]
+
+def iter_scan_paths(roots, all_files=False):
+    # Files below each root (or the root itself), in a stable order
+    for root in roots:
+        if not os.path.isdir(root):
+            yield root
+            continue
+        for dir_path, dirs, files in os.walk(root):
+            dirs.sort()
+            for file_name in sorted(files):
+                if all_files or file_name.lower().endswith(SCAN_EXTENSIONS):
+                    yield os.path.join(dir_path, file_name)
+
+def iter_batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+def scan_paths(roots, processes=None, all_files=False, legacy=LEGACY_HEADERS, head_bytes=SCAN_HEAD_BYTES):
+    # Reports for every file below roots, in walk order, from a process pool. At most two
+    # batches per process are in flight, so the walk is never materialized.
+    processes = processes or os.cpu_count() or 1
+    batches = iter_batches(iter_scan_paths(roots, all_files), SCAN_BATCH_FILES)
+    if processes == 1:
+        for batch in batches:
+            yield from scan_files(batch, legacy, head_bytes)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        submit = lambda batch: executor.submit(scan_files, batch, legacy, head_bytes)
+        for _, future in iter_bounded(submit, batches, 2 * processes):
+            yield from future.result()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the MP3s that carry a hidden payload")
+    parser.add_argument("paths", nargs="+", help="directories (scanned recursively) or files")
+    parser.add_argument("--output", help="JSONL report to write (default: stdout)")
+    parser.add_argument("--processes", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("--all-files", action="store_true", help="scan every file, not only *.mp3")
+    parser.add_argument("--legacy", action="store_true", help="also report version 1 files (default: STEGO_LEGACY_HEADERS)")
+    parser.add_argument("--head-bytes", type=int, default=SCAN_HEAD_BYTES, help="first read per file")
+    args = parser.parse_args(argv)
+
+    counts = Counter()
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for report in scan_paths(args.paths, args.processes, args.all_files, LEGACY_HEADERS or args.legacy, args.head_bytes):
+            counts[report["status"]] += 1
+            output.write(json.dumps(report) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    summary = ", ".join(f"{status} {count}" for status, count in sorted(counts.items()))
+    print(f"Scanned {sum(counts.values())} files: {summary}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
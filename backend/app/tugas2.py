@@ -1,7 +1,19 @@
+import logging
+import os
 import random
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
 from pydub import AudioSegment
 import magic
 import numpy as np
+from app.cache import LRUCache, content_hash
+from app.metrics import stage
+
+logger = logging.getLogger(__name__)
 
 def get_mime_type(bytes_data):
     return magic.from_buffer(bytes(bytes_data), mime=True)
@@ -203,24 +215,242 @@ def extract_message(stego_path, key=""):
         "extension": extension,
     }
 
-def calculatePSNR(seg_original, seg_stego):
-    originalAudio = np.array(AudioSegment.from_mp3(seg_original).get_array_of_samples())
-    stegoAudio = np.array(AudioSegment.from_mp3(seg_stego).get_array_of_samples())
-    mse = np.mean((originalAudio - stegoAudio) ** 2)
+PSNR_CHUNK_SAMPLES = 1 << 18 # Interleaved 16-bit samples compared per step
+PSNR_BATCH_DECODERS = int(os.environ.get("PSNR_BATCH_DECODERS", 4)) # Stegos decoded at once in a batch
+
+# Decoded cover PCM, keyed by a hash of the MP3 content. Each worker process has its own
+# memory cache (its hits and misses are summed in /metrics); the optional spill directory is
+# shared by all of them.
+PCM_CACHE_ENTRIES = int(os.environ.get("PCM_CACHE_ENTRIES", 16))
+PCM_CACHE_BYTES = int(os.environ.get("PCM_CACHE_BYTES", 512 << 20))
+PCM_CACHE_DIR = os.environ.get("PCM_CACHE_DIR") or None
+PCM_CACHE_DISK_BYTES = int(os.environ.get("PCM_CACHE_DISK_BYTES", 4 << 30))
+
+pcm_cache = LRUCache(PCM_CACHE_ENTRIES, PCM_CACHE_BYTES, "pcm")
+
+def pcm_cache_path(key):
+    return os.path.join(PCM_CACHE_DIR, key.hex() + ".pcm")
+
+def load_cached_pcm(key):
+    pcm = pcm_cache.get(key)
+    if pcm is None and PCM_CACHE_DIR:
+        path = pcm_cache_path(key)
+        try:
+            with open(path, "rb") as f:
+                pcm = f.read()
+            os.utime(path) # Mark as recently used for pruning
+        except FileNotFoundError:
+            return None
+        pcm_cache.put(key, pcm, len(pcm))
+    return pcm
+
+def store_cached_pcm(key, pcm):
+    pcm_cache.put(key, pcm, len(pcm))
+    if PCM_CACHE_DIR:
+        spill_pcm(key, pcm)
+
+def spill_pcm(key, pcm):
+    path = pcm_cache_path(key)
+    if os.path.exists(path):
+        return
+    os.makedirs(PCM_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pcm)
+    os.replace(tmp_path, path) # Readers never see a partial file
+    prune_pcm_dir()
+
+def prune_pcm_dir():
+    # Drop least recently used spill files until the directory fits its budget
+    entries = []
+    with os.scandir(PCM_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".pcm"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= PCM_CACHE_DISK_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass # Pruned by another worker
+        total -= size
+
+def open_pcm_decoder(source):
+    # ffmpeg (the same binary pydub uses) decoding to raw 16-bit PCM on stdout.
+    # Paths are read by ffmpeg itself, file-like objects are fed through stdin by a thread.
+    is_path = isinstance(source, str) or hasattr(source, "__fspath__")
+    command = [AudioSegment.converter, "-v", "error", "-i", str(source) if is_path else "pipe:0",
+               "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"]
+    proc = subprocess.Popen(command, stdin=subprocess.DEVNULL if is_path else subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    feeder = None
+    if not is_path:
+        def feed():
+            try:
+                shutil.copyfileobj(source, proc.stdin)
+            except (BrokenPipeError, ValueError):
+                pass # Decoder exited early, its return code reports the failure
+            finally:
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+    return proc, feeder
+
+def close_pcm_decoder(proc, feeder):
+    if proc.poll() is None:
+        proc.kill()
+    proc.stdout.close()
+    proc.wait()
+    if feeder is not None:
+        feeder.join()
+
+@contextmanager
+def pcm_stream(source):
+    # Readable stream of decoded PCM; raises after the body if ffmpeg failed
+    proc, feeder = open_pcm_decoder(source)
+    try:
+        yield proc.stdout
+        proc.wait()
+        if proc.returncode != 0:
+            raise ValueError("Failed to decode audio")
+    finally:
+        close_pcm_decoder(proc, feeder)
+
+class PCMRecorder:
+    # Passes reads through while keeping a copy, so a cover decoded once can be cached
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = []
+        self.complete = False
+
+    def read(self, size):
+        chunk = self.stream.read(size)
+        self.chunks.append(chunk)
+        if len(chunk) < size:
+            self.complete = True # Short read: end of stream
+        return chunk
+
+@contextmanager
+def cached_pcm_stream(data):
+    # Decoded PCM of MP3 bytes, from the cache when possible; on a miss the decode is
+    # streamed and the PCM stored once it has been read to the end
+    key = content_hash(data)
+    pcm = load_cached_pcm(key)
+    if pcm is not None:
+        yield BytesIO(pcm)
+        return
+    with pcm_stream(BytesIO(data)) as stream:
+        recorder = PCMRecorder(stream)
+        yield recorder
+    if recorder.complete:
+        store_cached_pcm(key, b"".join(recorder.chunks))
+
+def get_cached_pcm(data):
+    key = content_hash(data)
+    pcm = load_cached_pcm(key)
+    if pcm is None:
+        with pcm_stream(BytesIO(data)) as stream:
+            pcm = stream.read()
+        store_cached_pcm(key, pcm)
+    return pcm
+
+def compare_pcm(original_pcm, stego_pcm, on_mismatch="truncate", chunk_samples=PSNR_CHUNK_SAMPLES):
+    # Squared error and sample count of two PCM streams, compared chunk by chunk.
+    # Squared error is accumulated in 64-bit (int16 differences overflow).
+    # on_mismatch decides what happens when the decoded lengths differ:
+    #   "truncate" compares the common prefix, "pad" compares the extra samples against silence,
+    #   "error" raises ValueError
+    if on_mismatch not in ("truncate", "pad", "error"):
+        raise ValueError("on_mismatch must be 'truncate', 'pad' or 'error'")
+
+    chunk_bytes = 2 * chunk_samples
+    squared_error = 0
+    n_samples = 0
+    while True:
+        original_chunk = original_pcm.read(chunk_bytes)
+        stego_chunk = stego_pcm.read(chunk_bytes)
+        n = min(len(original_chunk), len(stego_chunk)) // 2
+        if n:
+            diff = np.frombuffer(original_chunk, dtype=np.int16, count=n).astype(np.int64)
+            diff -= np.frombuffer(stego_chunk, dtype=np.int16, count=n)
+            squared_error += int(np.dot(diff, diff))
+            n_samples += n
+        if len(original_chunk) == len(stego_chunk) == chunk_bytes:
+            continue
+
+        # At least one stream has ended
+        rest = original_chunk[2*n:] or stego_chunk[2*n:]
+        longer = original_pcm if len(original_chunk) > len(stego_chunk) else stego_pcm
+        extra_samples = 0
+        while rest:
+            if on_mismatch == "error":
+                raise ValueError("Decoded audio lengths differ")
+            extra_samples += len(rest) // 2
+            if on_mismatch == "pad":
+                tail = np.frombuffer(rest, dtype=np.int16, count=len(rest) // 2).astype(np.int64)
+                squared_error += int(np.dot(tail, tail))
+            rest = longer.read(chunk_bytes)
+        if on_mismatch == "pad":
+            n_samples += extra_samples
+        elif extra_samples:
+            logger.info("PSNR: ignoring %d trailing samples of the longer file", extra_samples)
+        return squared_error, n_samples
+
+def psnr_from_error(squared_error, n_samples):
+    if n_samples == 0:
+        raise ValueError("No audio samples to compare")
+    mse = squared_error / n_samples
     if mse == 0:
         return float('inf')  # No noise, PSNR is infinite
     max_pixel = 2**15 - 1  # Max value for 16-bit audio
     psnr = 20 * np.log10(max_pixel / np.sqrt(mse))
     return psnr
 
+def calculatePSNR(seg_original, seg_stego, on_mismatch="truncate", chunk_samples=PSNR_CHUNK_SAMPLES):
+    # Both files are decoded at the same time and compared as the PCM arrives,
+    # so memory stays constant in track length
+    with pcm_stream(seg_original) as original_pcm, pcm_stream(seg_stego) as stego_pcm:
+        squared_error, n_samples = compare_pcm(original_pcm, stego_pcm, on_mismatch, chunk_samples)
+    return psnr_from_error(squared_error, n_samples)
+
+def calculatePSNR_bytes(original_data, stego_data, on_mismatch="truncate"):
+    # Same as calculatePSNR for MP3 bytes; the decoded cover is cached for later comparisons
+    with stage("decode_compare"):
+        with cached_pcm_stream(original_data) as original_pcm, pcm_stream(BytesIO(stego_data)) as stego_pcm:
+            squared_error, n_samples = compare_pcm(original_pcm, stego_pcm, on_mismatch)
+    return psnr_from_error(squared_error, n_samples)
+
+def calculatePSNR_batch(original_data, stego_list, on_mismatch="truncate"):
+    # PSNR of every stego against one cover, which is decoded only once.
+    # Returns one entry per stego: the PSNR value, or the exception that stopped it.
+    with stage("decode_cover"):
+        original_pcm = get_cached_pcm(original_data)
+
+    def compare(stego_data):
+        try:
+            with pcm_stream(BytesIO(stego_data)) as stego_pcm:
+                squared_error, n_samples = compare_pcm(BytesIO(original_pcm), stego_pcm, on_mismatch)
+            return psnr_from_error(squared_error, n_samples)
+        except Exception as e:
+            return e
+
+    with stage("decode_compare"), ThreadPoolExecutor(max_workers=max(1, min(PSNR_BATCH_DECODERS, len(stego_list)))) as executor:
+        return list(executor.map(compare, stego_list))
+
 def generate_rand_index(key, lenbits_length, message_length, n_LSB, samples_length):
     seed = sum(ord(c) for c in key)
-    random.seed(seed)
+    rng = random.Random(seed) # Own generator per call, see app.util.generate_rand_index
 
     frame_needed = message_length + (n_LSB - 1) // n_LSB
     lenbits_frame = (lenbits_length + (n_LSB - 1) // n_LSB)
     max_idx = samples_length - frame_needed
-    return random.randint(lenbits_frame, max_idx)
+    return rng.randint(lenbits_frame, max_idx)
 
 # y = embed_message("tes.mp3", "Secret.txt", is_encrypt=False, key="BANA", is_random=True, n_LSB=8)
 # print(y["psnr"])
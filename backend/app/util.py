@@ -33,13 +33,62 @@ def write_file(file_path, data):
     with open(file_path, "wb") as f:
         f.write(data)
 
+import mmap
+from contextlib import contextmanager
+def close_quietly(mapping):
+    # Close an mmap or SharedMemory block unless arrays still point into it (e.g. held by a
+    # traceback); it is then unmapped once they are collected
+    try:
+        mapping.close()
+    except BufferError:
+        pass
+
+@contextmanager
+def map_file(file_path, writable=False):
+    # Memory-map a whole file, read-only unless writable (empty files cannot be mapped)
+    with open(file_path, "r+b" if writable else "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield bytearray() if writable else b''
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            close_quietly(mapped)
+
+### BIT UTILITIES ###
+import numpy as np
+def bits_to_lsb_groups(bits, n_LSB):
+    # Regroup a 0/1 bit array into n_LSB-wide values, first bit in the highest position.
+    # A short last group is left-aligned (its unused low bits are zero).
+    groups = -(-len(bits) // n_LSB)
+    padded = np.zeros(groups * n_LSB, dtype=np.uint8)
+    padded[:len(bits)] = bits
+    values = np.zeros(groups, dtype=np.uint8)
+    for j in range(n_LSB):
+        values = (values << 1) | padded[j::n_LSB]
+    return values
+
+def lsb_groups_to_bits(values, n_LSB):
+    # Inverse of bits_to_lsb_groups: expand n_LSB-wide values into a 0/1 bit array
+    return np.unpackbits(np.asarray(values, dtype=np.uint8)[:, None], axis=1)[:, 8-n_LSB:].ravel()
+
 ### RANDOM UTILITIES ###
 import random
+import hashlib
 def generate_rand_index(key, last_metadata_frame, frame_count): # Range: [0, len_avail_frames])
+    # Own generator per call: seeding the module-level one races between concurrent requests
     seed = sum(ord(c) for c in key)
-    random.seed(seed)
+    rng = random.Random(seed)
+
+    return rng.randint(0, frame_count - last_metadata_frame + 1)
 
-    return random.randint(0, frame_count - last_metadata_frame + 1)
+def generate_frame_permutation(key, first_frame, frame_count):
+    # Frames [first_frame, frame_count) in an order derived from the whole key. Sorting raw
+    # PCG64 output keeps the order stable across NumPy versions (Generator.permutation is not).
+    seed = int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest(), "big")
+    raw = np.random.PCG64(seed).random_raw(max(frame_count - first_frame, 0))
+    return np.argsort(raw, kind="stable") + first_frame
 
 ### CRYPTOGRAPHY UTILITIES ###
 def encrypt_vigenere(plaintext, key):
@@ -69,31 +118,99 @@ def decrypt_vigenere(ciphertext, key):
     return ''.join(plaintext)
 
 ### FRAME HEADER UTILITIES ###
+
+BITRATE_TABLE = {
+    (3, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320], # MPEG1 Layer I
+    (3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384], # MPEG1 Layer II
+    (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320], # MPEG1 Layer III
+    (2, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224], # MPEG2 Layer I
+    (2, 2): [0, 8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2 Layer II
+    (2, 1): [0, 8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2 Layer III
+    (0, 3): [0,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160 ,176 ,192 ,224], # MPEG2.5 Layer I
+    (0, 2): [0,8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2.5 Layer II
+    (0, 1): [0,8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2.5 Layer III
+}
+
+SAMPLE_RATE_TABLE = {
+    0: [11025, 12000, 8000],  # MPEG 2.5
+    2: [22050, 24000, 16000], # MPEG 2
+    3: [44100, 48000, 32000], # MPEG 1
+}
+
 def calculate_frame_size(bitrate, sample_rate, padding=0):
     return (144 * bitrate // sample_rate) + padding
 
 def calc_bitrate(version_id, layer_desc, bitrate_index):
-    BITRATE_TABLE = {
-        (3, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320], # MPEG1 Layer I
-        (3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384], # MPEG1 Layer II
-        (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320], # MPEG1 Layer III
-        (2, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224], # MPEG2 Layer I
-        (2, 2): [0, 8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2 Layer II
-        (2, 1): [0, 8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2 Layer III
-        (0, 3): [0,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160 ,176 ,192 ,224], # MPEG2.5 Layer I
-        (0, 2): [0,8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2.5 Layer II
-        (0, 1): [0,8 ,16 ,24 ,32 ,40 ,48 ,56 ,64 ,80 ,96 ,112 ,128 ,144 ,160], # MPEG2.5 Layer III
-    }
     return BITRATE_TABLE.get((version_id, layer_desc), [0]*15)[bitrate_index]
 
 def calc_sample_rate(version_id, sampling_rate_index):
-    SAMPLE_RATE_TABLE = {
-        0: [11025, 12000, 8000],  # MPEG 2.5
-        2: [22050, 24000, 16000], # MPEG 2
-        3: [44100, 48000, 32000], # MPEG 1
-    }
     return SAMPLE_RATE_TABLE.get(version_id, [0]*3)[sampling_rate_index]
 
+# Lookup arrays for the vectorized decoder, indexed [version_id, layer_desc, bitrate_index]
+# and [version_id, sampling_rate_index]. Index 15 / 3 (which make the scalar lookups raise)
+# stay 0 so they are rejected like any other invalid header.
+BITRATE_LUT = np.zeros((4, 4, 16), dtype=np.int64)
+for (version_id, layer_desc), rates in BITRATE_TABLE.items():
+    BITRATE_LUT[version_id, layer_desc, :15] = rates
+SAMPLE_RATE_LUT = np.zeros((4, 4), dtype=np.int64)
+for version_id, rates in SAMPLE_RATE_TABLE.items():
+    SAMPLE_RATE_LUT[version_id, :3] = rates
+
+SCAN_BLOCK_SIZE = 1 << 22 # Bytes examined per block when looking for sync words
+
+def find_sync_candidates(data, end):
+    # Positions p < end with data[p] == 0xFF and the top 3 bits of data[p+1] set
+    blocks = []
+    for start in range(0, end, SCAN_BLOCK_SIZE):
+        stop = min(start + SCAN_BLOCK_SIZE, end)
+        idx = np.flatnonzero(data[start:stop] == 0xFF) + start
+        blocks.append(idx[(data[idx + 1] & 0xE0) == 0xE0])
+    if not blocks:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(blocks).astype(np.int64)
+
+def read_frame_headers(data, positions):
+    # Big-endian 32-bit headers starting at each position
+    headers = np.zeros(len(positions), dtype=np.uint32)
+    for k in range(4):
+        headers = (headers << 8) | data[positions + k]
+    return headers
+
+def decode_frame_headers(headers):
+    # Vectorized extract_frame_info + frame size; invalid headers get size 0
+    headers = np.asarray(headers, dtype=np.uint32)
+    version_id = (headers >> 19) & 0x3
+    layer_desc = (headers >> 17) & 0x3
+    protection_bit = (headers >> 16) & 0x1
+    bitrate_index = (headers >> 12) & 0xF
+    sampling_rate_index = (headers >> 10) & 0x3
+    padding_bit = (headers >> 9) & 0x1
+
+    bitrate = BITRATE_LUT[version_id, layer_desc, bitrate_index]
+    sample_rate = SAMPLE_RATE_LUT[version_id, sampling_rate_index]
+    valid = (bitrate != 0) & (sample_rate != 0)
+
+    frame_size = np.zeros(len(headers), dtype=np.int64)
+    frame_size[valid] = 144 * bitrate[valid] * 1000 // sample_rate[valid] + padding_bit[valid]
+    return frame_size, protection_bit == 0
+
+def follow_frame_chain(succ):
+    # Indices reached from header 0 through succ (succ[k] > k, len(succ) ends the chain).
+    # Pointer doubling: after round t the first 2^t hops are known and jump = succ^(2^t).
+    end = len(succ)
+    if end == 0:
+        return np.zeros(0, dtype=np.int64)
+    jump = np.append(succ, end)
+    visited = np.zeros(1, dtype=np.int64)
+    while True:
+        reached = jump[visited]
+        reached = reached[reached < end]
+        if len(reached) == 0:
+            break
+        visited = np.concatenate([visited, reached])
+        jump = jump[jump]
+    return np.sort(visited)
+
 def extract_frame_info(frame_header):
     if len(frame_header) < 4:
         raise ValueError("Frame header must be at least 4 bytes long")
@@ -123,4 +240,17 @@ def extract_frame_info(frame_header):
         'private_bit': private_bit,
         'channel_mode': channel_mode,
         'mode_extension': mode_extension
-    }
\ No newline at end of file
+    }
+def decode_frame_header(frame_header):
+    # Scalar decode_frame_headers for one header: (frame size or 0 if invalid, has_crc)
+    frame_info = extract_frame_info(frame_header)
+    if frame_info['sync'] != 0x7FF:
+        return 0, False
+    try:
+        bitrate = calc_bitrate(frame_info['version_id'], frame_info['layer_desc'], frame_info['bitrate_index'])
+        sample_rate = calc_sample_rate(frame_info['version_id'], frame_info['sampling_rate_index'])
+    except IndexError:
+        return 0, False
+    if bitrate == 0 or sample_rate == 0:
+        return 0, False
+    return calculate_frame_size(bitrate * 1000, sample_rate, frame_info['padding_bit']), frame_info['protection_bit'] == 0
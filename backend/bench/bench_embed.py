@@ -0,0 +1,41 @@
+# Throughput of the packed-bit embedding engine against the original bit loop. The outputs differ
+# since the version 2 header, so both are checked by extracting them with the new engine instead.
+# Run from backend/: python -m bench.bench_embed [message_kb ...]
+import os
+import sys
+import tempfile
+os.environ.setdefault("STEGO_LEGACY_HEADERS", "1") # The reference stegos are version 1 files; set before app.new reads it
+from app.new import embed_message, extract_message_bytes
+from bench import reference
+from bench.bench_frames import timed
+from bench.synth import make_mp3
+
+def main(sizes_kb):
+    audio_data = make_mp3(20000, junk=4096)
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "cover.mp3")
+        message_path = os.path.join(tmp, "message.bin")
+        with open(audio_path, "wb") as f:
+            f.write(audio_data)
+
+        for size_kb in sizes_kb:
+            message = os.urandom(int(size_kb * 1024))
+            with open(message_path, "wb") as f:
+                f.write(message)
+            mb = size_kb / 1024
+
+            for n_LSB in range(1, 5):
+                for is_random in (False, True):
+                    args = (audio_path, message_path, False, "bench-key", is_random, n_LSB)
+                    stego, fast = timed(embed_message, *args)
+                    expected, slow = timed(reference.embed_message, *args)
+                    for name, data in (("packed", stego), ("reference", expected)):
+                        if bytes(extract_message_bytes(data, "bench-key")["data"]) != message:
+                            raise AssertionError(f"{name} stego does not round trip (n_LSB={n_LSB}, random={is_random})")
+
+                    print(f"{size_kb:7.0f} KB  n_LSB={n_LSB}  random={is_random!s:5}  "
+                          f"reference {mb / slow:7.2f} MB/s  packed {mb / fast:7.2f} MB/s  "
+                          f"speedup {slow / fast:6.1f}x")
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or [64, 512])
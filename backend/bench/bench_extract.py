@@ -0,0 +1,47 @@
+# Throughput of the bulk extraction engine against the original string-building loop, on stegos
+# written by the original embedder (version 1 length field), so it doubles as a legacy check
+# Run from backend/: python -m bench.bench_extract [message_kb ...]
+import contextlib
+import io
+import os
+import sys
+import tempfile
+os.environ.setdefault("STEGO_LEGACY_HEADERS", "1") # The reference stegos are version 1 files; set before app.new reads it
+from app.new import extract_message
+from bench import reference
+from bench.bench_frames import timed
+from bench.synth import make_mp3
+
+def main(sizes_kb):
+    audio_data = make_mp3(20000, junk=4096)
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "cover.mp3")
+        message_path = os.path.join(tmp, "message.bin")
+        stego_path = os.path.join(tmp, "stego.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(audio_data)
+
+        for size_kb in sizes_kb:
+            message = os.urandom(int(size_kb * 1024))
+            with open(message_path, "wb") as f:
+                f.write(message)
+            mb = size_kb / 1024
+
+            for n_LSB in range(1, 5):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    stego = reference.embed_message(audio_path, message_path, False, "", False, n_LSB)
+                with open(stego_path, "wb") as f:
+                    f.write(stego)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result, fast = timed(extract_message, stego_path)
+                    expected, slow = timed(reference.extract_message, stego_path)
+                if bytes(result["data"]) != bytes(expected["data"]) or bytes(result["data"]) != message:
+                    raise AssertionError(f"Extracted payload differs (n_LSB={n_LSB})")
+
+                print(f"{size_kb:7.0f} KB  n_LSB={n_LSB}  "
+                      f"reference {mb / slow:7.2f} MB/s  bulk {mb / fast:7.2f} MB/s  "
+                      f"speedup {slow / fast:6.1f}x")
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or [16, 64])
@@ -0,0 +1,29 @@
+# Throughput of the vectorized frame scanner against the original byte loop
+# Run from backend/: python -m bench.bench_frames [size_mb ...]
+import sys
+import time
+from app.new import get_audio_frames
+from bench import reference
+from bench.synth import make_mp3
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main(sizes_mb):
+    for size_mb in sizes_mb:
+        audio_data = make_mp3(int(size_mb * (1 << 20)) // 418, junk=4096)
+        mb = len(audio_data) / (1 << 20)
+
+        frames, fast = timed(get_audio_frames, audio_data)
+        expected, slow = timed(reference.get_audio_frames, audio_data)
+        if frames != expected:
+            raise AssertionError("Frame tables differ")
+
+        print(f"{mb:7.1f} MB  {len(frames):7d} frames  "
+              f"reference {mb / slow:8.1f} MB/s  vectorized {mb / fast:8.1f} MB/s  "
+              f"speedup {slow / fast:6.1f}x")
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or [1, 4, 16])
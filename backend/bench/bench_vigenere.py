@@ -0,0 +1,28 @@
+# Throughput of the NumPy autokey Vigenere cipher against the string-based util functions
+# Run from backend/: python -m bench.bench_vigenere [size_kb ...]
+import os
+import sys
+from app.cipher import encrypt_vigenere_bytes, decrypt_vigenere_bytes
+from app.util import encrypt_vigenere, decrypt_vigenere
+from bench.bench_frames import timed
+
+def main(sizes_kb, key="BANAMAN"):
+    for size_kb in sizes_kb:
+        plaintext = os.urandom(int(size_kb * 1024))
+        mb = len(plaintext) / (1 << 20)
+
+        ciphertext, enc_fast = timed(encrypt_vigenere_bytes, plaintext, key)
+        expected, enc_slow = timed(encrypt_vigenere, plaintext.decode('latin1'), key)
+        if ciphertext != expected.encode('latin1'):
+            raise AssertionError("Ciphertext differs")
+
+        decrypted, dec_fast = timed(decrypt_vigenere_bytes, ciphertext, key)
+        expected, dec_slow = timed(decrypt_vigenere, ciphertext.decode('latin1'), key)
+        if decrypted != expected.encode('latin1') or decrypted != plaintext:
+            raise AssertionError("Plaintext differs")
+
+        print(f"{size_kb:8.0f} KB  encrypt {mb / enc_slow:8.2f} -> {mb / enc_fast:9.1f} MB/s  "
+              f"decrypt {mb / dec_slow:8.2f} -> {mb / dec_fast:9.1f} MB/s")
+
+if __name__ == "__main__":
+    main([float(x) for x in sys.argv[1:]] or [64, 1024, 4096])
@@ -0,0 +1,213 @@
+# Benchmark suite for the steganography hot paths on synthetic MP3 streams (no ffmpeg needed).
+# Writes machine-readable JSON so runs can be compared between commits.
+# Run from backend/: python -m bench.suite [--quick] [--output results.json] [--compare baseline.json]
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+from app.new import get_audio_frames, embed_message, extract_message, frame_cache
+from app.new import embed_message_bytes, embed_message_parallel, get_frame_index, calc_capacity
+from app.cipher import encrypt_vigenere_bytes, decrypt_vigenere_bytes
+from app.util import get_mime_type
+from bench.synth import make_mp3_of_size
+
+FULL = {
+    "frame_sizes_mb": [1, 8],
+    "frame_layouts": [
+        {"version": "1", "bitrate": 128, "crc": False},
+        {"version": "1", "bitrate": 320, "crc": True},
+        {"version": "1", "bitrate": 32, "crc": False},
+        {"version": "2", "bitrate": 64, "crc": False},
+        {"version": "2.5", "bitrate": 32, "crc": True},
+    ],
+    "cover_mb": 8,
+    "payload_kb": [1, 64, 512],
+    "cipher_kb": [64, 1024, 4096],
+    "mime_kb": [1, 1024, 16384],
+    "parallel_cover_mb": 64,
+    "repeat": 5,
+}
+
+QUICK = {
+    "frame_sizes_mb": [1],
+    "frame_layouts": FULL["frame_layouts"][:2],
+    "cover_mb": 2,
+    "payload_kb": [1, 64],
+    "cipher_kb": [64, 1024],
+    "mime_kb": [1, 1024],
+    "parallel_cover_mb": 8,
+    "repeat": 3,
+}
+
+def measure(fn, repeat, setup=None):
+    # Best and mean wall time of fn() over repeat runs; setup() runs untimed before each one
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+    return result, min(times), sum(times) / len(times)
+
+def record(results, bench, params, n_bytes, best, mean):
+    results.append({
+        "bench": bench,
+        "params": params,
+        "bytes": n_bytes,
+        "best_s": best,
+        "mean_s": mean,
+        "mb_per_s": n_bytes / (1 << 20) / best if best > 0 else None,
+    })
+    print(f"{bench:18} {json.dumps(params):70} {n_bytes / (1 << 20) / best:10.2f} MB/s  best {best * 1000:9.2f} ms")
+
+def bench_frames(config, results):
+    for layout in config["frame_layouts"]:
+        for size_mb in config["frame_sizes_mb"]:
+            audio_data = make_mp3_of_size(size_mb << 20, layout["bitrate"], layout["version"], crc=layout["crc"], junk=4096)
+            _, best, mean = measure(lambda: get_audio_frames(audio_data), config["repeat"])
+            record(results, "get_audio_frames", dict(layout, size_mb=size_mb), len(audio_data), best, mean)
+
+def bench_embed_extract(config, results):
+    # Frame tables are cached by content, so the cache is cleared to time cold runs
+    audio_data = make_mp3_of_size(config["cover_mb"] << 20, junk=4096)
+    with tempfile.TemporaryDirectory() as tmp:
+        audio_path = os.path.join(tmp, "cover.mp3")
+        message_path = os.path.join(tmp, "message.bin")
+        stego_path = os.path.join(tmp, "stego.mp3")
+        with open(audio_path, "wb") as f:
+            f.write(audio_data)
+
+        for size_kb in config["payload_kb"]:
+            message = os.urandom(size_kb * 1024)
+            with open(message_path, "wb") as f:
+                f.write(message)
+            for n_LSB in range(1, 5):
+                params = {"cover_mb": config["cover_mb"], "payload_kb": size_kb, "n_LSB": n_LSB}
+                try:
+                    stego, best, mean = measure(lambda: embed_message(audio_path, message_path, True, "bench-key", False, n_LSB),
+                                                config["repeat"], frame_cache.clear)
+                except ValueError:
+                    continue # Does not fit at this n_LSB
+                record(results, "embed_message", params, len(message), best, mean)
+
+                with open(stego_path, "wb") as f:
+                    f.write(stego)
+                extracted, best, mean = measure(lambda: extract_message(stego_path, "bench-key"), config["repeat"], frame_cache.clear)
+                if bytes(extracted["data"]) != message:
+                    raise AssertionError(f"Extracted payload differs (payload_kb={size_kb}, n_LSB={n_LSB})")
+                record(results, "extract_message", params, len(message), best, mean)
+
+def bench_cipher(config, results, key="BANAMAN"):
+    for size_kb in config["cipher_kb"]:
+        plaintext = os.urandom(size_kb * 1024)
+        ciphertext, best, mean = measure(lambda: encrypt_vigenere_bytes(plaintext, key), config["repeat"])
+        record(results, "encrypt_vigenere", {"size_kb": size_kb}, len(plaintext), best, mean)
+        decrypted, best, mean = measure(lambda: decrypt_vigenere_bytes(ciphertext, key), config["repeat"])
+        if decrypted != plaintext:
+            raise AssertionError("Plaintext differs")
+        record(results, "decrypt_vigenere", {"size_kb": size_kb}, len(plaintext), best, mean)
+
+def bench_mime(config, results):
+    rng = np.random.default_rng(0)
+    for size_kb in config["mime_kb"]:
+        samples = {
+            "text": (b"lorem ipsum dolor sit amet\n" * (size_kb * 40))[:size_kb * 1024],
+            "png": (b"\x89PNG\r\n\x1a\n" + rng.bytes(size_kb * 1024))[:size_kb * 1024],
+            "random": rng.bytes(size_kb * 1024),
+        }
+        for kind, data in samples.items():
+            _, best, mean = measure(lambda: get_mime_type(data), config["repeat"])
+            record(results, "get_mime_type", {"size_kb": size_kb, "kind": kind}, len(data), best, mean)
+
+def bench_parallel(config, results, n_LSB=2):
+    # Sharded embed against the serial one on a large cover filled to 90%, for growing process counts.
+    # The frame table stays cached: only planning and writing are compared.
+    audio_data = make_mp3_of_size(config["parallel_cover_mb"] << 20, junk=4096)
+    _, payload_bytes = get_frame_index(audio_data)
+    message = os.urandom(calc_capacity(payload_bytes, n_LSB) * 9 // 10)
+    params = {"cover_mb": config["parallel_cover_mb"], "payload_kb": len(message) // 1024, "n_LSB": n_LSB}
+    serial, best, mean = measure(lambda: embed_message_bytes(audio_data, message, True, "bench-key", False, n_LSB), config["repeat"])
+    record(results, "embed_serial", params, len(message), best, mean)
+    for processes in sorted({2, 4, os.cpu_count() or 1} - {1}):
+        stego, best, mean = measure(lambda: embed_message_parallel(audio_data, message, True, "bench-key", False, n_LSB, processes=processes),
+                                    config["repeat"])
+        if stego != serial:
+            raise AssertionError(f"Sharded embed differs from the serial one (processes={processes})")
+        record(results, "embed_parallel", dict(params, processes=processes), len(message), best, mean)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    # Speed ratio of every case also present in the baseline (> 1 is faster than the baseline)
+    with open(baseline_path) as f:
+        baseline = {(r["bench"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["bench"], json.dumps(r["params"], sort_keys=True)))
+        if old is not None:
+            ratio = old["best_s"] / r["best_s"]
+            flag = "  REGRESSION" if ratio < 0.9 else ""
+            print(f"{r['bench']:18} {json.dumps(r['params']):70} {ratio:6.2f}x{flag}")
+
+BENCHES = {
+    "frames": bench_frames,
+    "embed": bench_embed_extract,
+    "cipher": bench_cipher,
+    "mime": bench_mime,
+    "parallel": bench_parallel,
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the steganography hot paths")
+    parser.add_argument("--quick", action="store_true", help="smaller inputs and fewer repeats")
+    parser.add_argument("--only", choices=sorted(BENCHES), action="append", help="run only these groups")
+    parser.add_argument("--repeat", type=int, help="runs per case (best time is reported)")
+    parser.add_argument("--output", default="bench-results.json", help="JSON file to write")
+    parser.add_argument("--compare", help="earlier JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    config = dict(QUICK if args.quick else FULL)
+    if args.repeat:
+        config["repeat"] = args.repeat
+
+    results = []
+    for name in args.only or BENCHES:
+        BENCHES[name](config, results)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "repeat": config["repeat"],
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Synthetic MP3 frame streams for benchmarks (no encoder needed, payloads are random bytes)
+import random
+from app.util import BITRATE_TABLE, SAMPLE_RATE_TABLE, calculate_frame_size
+
+VERSION_IDS = {'1': 3, '2': 2, '2.5': 0}
+
+def make_frame_header(version_id, bitrate_index, sampling_rate_index, padding=0, crc=False):
+    header = 0x7FF << 21
+    header |= version_id << 19
+    header |= 1 << 17 # Layer III
+    header |= (0 if crc else 1) << 16
+    header |= bitrate_index << 12
+    header |= sampling_rate_index << 10
+    header |= padding << 9
+    header |= 1 << 6 # Joint stereo
+    return header.to_bytes(4, byteorder='big')
+
+def make_mp3(n_frames, bitrate=128, version='1', sampling_rate_index=0, crc=False, junk=0, seed=0):
+    rng = random.Random(seed)
+    version_id = VERSION_IDS[version]
+    bitrate_index = BITRATE_TABLE[(version_id, 1)].index(bitrate)
+    sample_rate = SAMPLE_RATE_TABLE[version_id][sampling_rate_index]
+
+    out = bytearray(rng.randbytes(junk)) # Leading garbage (e.g. an ID3 tag)
+    remainder = 0
+    for _ in range(n_frames):
+        # Pad the frames the way encoders do to keep the average bitrate exact
+        remainder += (144 * bitrate * 1000) % sample_rate
+        padding = 1 if remainder >= sample_rate else 0
+        remainder -= padding * sample_rate
+        size = calculate_frame_size(bitrate * 1000, sample_rate, padding)
+        header = make_frame_header(version_id, bitrate_index, sampling_rate_index, padding, crc)
+        out += header
+        out += rng.randbytes(size - 4)
+    out += rng.randbytes(junk)
+    return bytes(out)
+
+def make_mp3_of_size(size_bytes, bitrate=128, version='1', sampling_rate_index=0, crc=False, junk=0, seed=0):
+    # Stream of roughly size_bytes of frames with the given layout
+    version_id = VERSION_IDS[version]
+    sample_rate = SAMPLE_RATE_TABLE[version_id][sampling_rate_index]
+    n_frames = max(int(size_bytes * sample_rate / (144 * bitrate * 1000)), 1)
+    return make_mp3(n_frames, bitrate, version, sampling_rate_index, crc, junk, seed)